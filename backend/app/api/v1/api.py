@@ -1,5 +1,6 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, BackgroundTasks, HTTPException
 from api.v1.endpoints import training, races, calendar, chat
+from uuid import uuid4
 
 api_router = APIRouter()
 
@@ -35,20 +36,53 @@ async def health_check():
     return {"status": "ok", "message": "RaceBuddy API is healthy"}
 
 # NEW: Data management endpoints
-@api_router.post("/admin/ingest-data")
-async def trigger_data_ingestion():
-    """Trigga data ingestion (för admin/development)"""
+
+# In-memory status per ingestion job (single-process deployment)
+_ingestion_jobs = {}
+
+
+def _run_ingestion_job(job_id: str):
+    """Run data ingestion in the background and record the outcome"""
     from core.data_ingestion import data_ingestion
-    
+
+    from core.rag.agents import clear_rag_cache
+    from core.vector_store import get_vector_store
+
     try:
         result = data_ingestion.ingest_all_data()
-        return {
-            "status": "success",
-            "message": "Data ingestion completed",
-            "details": result
-        }
+        _ingestion_jobs[job_id] = {"status": "success", "details": result}
+        chat.invalidate_agent_status_cache()
+        # The store's semantic tier caches full retrieval results, so
+        # it must go before clearing the RAG cache - otherwise the
+        # refreshed lookups get re-fed stale pre-ingest results
+        get_vector_store().clear_query_caches()
+        clear_rag_cache()
     except Exception as e:
-        return {
-            "status": "error", 
-            "message": f"Data ingestion failed: {str(e)}"
-        }
\ No newline at end of file
+        _ingestion_jobs[job_id] = {"status": "error", "message": str(e)}
+
+
+@api_router.post("/admin/ingest-data", status_code=202)
+async def trigger_data_ingestion(background_tasks: BackgroundTasks):
+    """Trigga data ingestion (för admin/development)
+
+    Ingestion can take minutes on a real corpus, so it runs as a
+    background task; poll the job endpoint for completion.
+    """
+    job_id = uuid4().hex
+    _ingestion_jobs[job_id] = {"status": "running"}
+    background_tasks.add_task(_run_ingestion_job, job_id)
+
+    return {
+        "status": "accepted",
+        "message": "Data ingestion started",
+        "job_id": job_id
+    }
+
+
+@api_router.get("/admin/ingest-data/{job_id}")
+async def get_ingestion_status(job_id: str):
+    """Get status for a data ingestion job"""
+    job = _ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return {"job_id": job_id, **job}
\ No newline at end of file
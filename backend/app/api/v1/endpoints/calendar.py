@@ -1,47 +1,88 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from db.session import get_db
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only, undefer
+from db.session import get_async_db
 from db.models import TrainingPlan
-from core.ics_utils import generate_ics_file
-import io
+from core.ics_utils import iter_ics_file
 import os
 from datetime import datetime
 
 router = APIRouter()
 
+# Session-type histogram computed DB-side: Postgres walks the JSONB in C
+# and returns pre-aggregated (type, count) rows
+_SESSION_HISTOGRAM_SQL = text("""
+    SELECT session->>'type' AS session_type, COUNT(*) AS session_count
+    FROM training_plans,
+         jsonb_array_elements(plan_data::jsonb->'weeks') AS week,
+         jsonb_array_elements(week->'sessions') AS session
+    WHERE id = :plan_id
+    GROUP BY session_type
+""")
+
+
+async def _get_plan(db: AsyncSession, plan_id: str, *options) -> TrainingPlan:
+    """Fetch a training plan by primary key.
+
+    Session.get() emits a plain PK lookup and can serve repeat access
+    from the identity map instead of compiling a new query each call.
+    """
+    return await db.get(TrainingPlan, plan_id, options=options or None)
+
 
 @router.get("/plans/{plan_id}/export/ics")
-async def export_training_plan_ics(plan_id: str, db: Session = Depends(get_db)):
+async def export_training_plan_ics(plan_id: str, request: Request,
+                                   db: AsyncSession = Depends(get_async_db)):
     """Export training plan as .ics calendar file"""
 
-    # Get training plan
-    db_plan = db.query(TrainingPlan).filter(TrainingPlan.id == plan_id).first()
+    # Get training plan; only load the columns the ICS export needs
+    db_plan = await _get_plan(db, plan_id, load_only(
+        TrainingPlan.plan_data, TrainingPlan.race, TrainingPlan.race_date,
+        TrainingPlan.race_display_name, TrainingPlan.ics_filename,
+        TrainingPlan.created_at, TrainingPlan.updated_at))
 
     if not db_plan:
         raise HTTPException(status_code=404, detail="Training plan not found")
 
+    # Plans rarely change after generation but calendar clients re-fetch
+    # the ICS URL on a schedule; answer unchanged polls with 304
+    last_modified = db_plan.updated_at or db_plan.created_at
+    etag = f'W/"{plan_id}-{int(last_modified.timestamp())}"' \
+        if last_modified else None
+
+    if etag and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
     try:
-        # Generate ICS content
-        ics_content = generate_ics_file(
+        # Stream ICS content chunk by chunk instead of buffering the
+        # whole calendar in memory
+        # Display name and filename are precomputed at plan creation;
+        # fall back for rows created before those columns existed
+        race_name = db_plan.race_display_name or db_plan.race.title() + "löppet"
+        filename = db_plan.ics_filename or \
+            f"training_plan_{db_plan.race}_{plan_id[:8]}.ics"
+
+        ics_stream = iter_ics_file(
             plan_data=db_plan.plan_data,
             plan_id=plan_id,
-            race_name=db_plan.race.title() + "löppet",
+            race_name=race_name,
             race_date=db_plan.race_date
         )
 
-        # Create file stream
-        ics_file = io.BytesIO(ics_content.encode('utf-8'))
-
-        # Generate filename
-        filename = f"training_plan_{db_plan.race}_{plan_id[:8]}.ics"
+        headers = {
+            "Content-Disposition": f'attachment; filename="{filename}"'
+        }
+        if etag:
+            headers["ETag"] = etag
+            headers["Last-Modified"] = \
+                last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT")
 
         return StreamingResponse(
-            ics_file,
+            ics_stream,
             media_type="text/calendar",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
+            headers=headers
         )
 
     except Exception as e:
@@ -52,21 +93,23 @@ async def export_training_plan_ics(plan_id: str, db: Session = Depends(get_db)):
 
 
 @router.get("/plans/{plan_id}/export/json")
-async def export_training_plan_json(plan_id: str, db: Session = Depends(get_db)):
+async def export_training_plan_json(plan_id: str, db: AsyncSession = Depends(get_async_db)):
     """Export training plan as JSON"""
 
-    db_plan = db.query(TrainingPlan).filter(TrainingPlan.id == plan_id).first()
+    # plan_data is deferred in the mapper and lazy loads don't work on
+    # an AsyncSession, so opt back in explicitly
+    db_plan = await _get_plan(db, plan_id, undefer(TrainingPlan.plan_data))
 
     if not db_plan:
         raise HTTPException(status_code=404, detail="Training plan not found")
 
-    # Return plan data
+    # Return plan data (orjson serializes date/datetime natively)
     export_data = {
         "plan_id": db_plan.id,
-        "created_at": db_plan.created_at.isoformat(),
+        "created_at": db_plan.created_at,
         "race": db_plan.race,
         "target_time": db_plan.target_time,
-        "race_date": db_plan.race_date.isoformat(),
+        "race_date": db_plan.race_date,
         "user_info": {
             "fitness_level": db_plan.fitness_level,
             "gender": db_plan.gender,
@@ -84,36 +127,40 @@ async def export_training_plan_json(plan_id: str, db: Session = Depends(get_db))
 
 
 @router.get("/plans/{plan_id}/summary")
-async def get_plan_summary(plan_id: str, db: Session = Depends(get_db)):
+async def get_plan_summary(plan_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get training plan summary"""
 
-    db_plan = db.query(TrainingPlan).filter(TrainingPlan.id == plan_id).first()
+    db_plan = await _get_plan(db, plan_id)
 
     if not db_plan:
         raise HTTPException(status_code=404, detail="Training plan not found")
 
-    # Calculate statistics from plan data
-    weeks_data = db_plan.plan_data.get("weeks", [])
-
-    # Count training types
-    session_types = {}
-    total_sessions = 0
-
-    for week in weeks_data:
-        for session in week.get("sessions", []):
-            session_type = session.get("type", "Unknown")
-            session_types[session_type] = session_types.get(
-                session_type, 0) + 1
-            total_sessions += 1
-
-    # Calculate distance distribution per week
-    weekly_distances = []
-    for week in weeks_data:
-        weekly_distances.append({
+    # Use aggregates precomputed at plan creation; fall back to computing
+    # from plan data for rows created before the aggregate columns existed
+    session_types = db_plan.session_distribution
+    weekly_progression = db_plan.weekly_progression
+
+    if session_types is None or weekly_progression is None:
+        # Legacy row: plan_data is deferred, fetch it in its own query
+        plan_data = (await db.execute(
+            select(TrainingPlan.plan_data)
+            .where(TrainingPlan.id == plan_id))).scalar_one()
+        weeks_data = plan_data.get("weeks", [])
+
+        # Aggregate the histogram in Postgres instead of walking every
+        # session dict in Python
+        result = await db.execute(
+            _SESSION_HISTOGRAM_SQL, {"plan_id": plan_id})
+        session_types = {row.session_type or "Unknown": row.session_count
+                         for row in result}
+
+        weekly_progression = [{
             "week": week.get("week_number"),
-            "distance": week.get("total_distance_km"),
+            "distance": int(week.get("total_distance_km")),
             "focus": week.get("focus")
-        })
+        } for week in weeks_data]
+
+    total_sessions = sum(session_types.values())
 
     summary = {
         "plan_id": db_plan.id,
@@ -125,15 +172,11 @@ async def get_plan_summary(plan_id: str, db: Session = Depends(get_db)):
             "avg_distance_per_week": int(round(db_plan.total_distance_km / max(db_plan.total_weeks, 1)))
         },
         "session_distribution": session_types,
-        "weekly_progression": [{
-            "week": week.get("week_number"),
-            "distance": int(week.get("total_distance_km")),
-            "focus": week.get("focus")
-        } for week in weekly_distances],
+        "weekly_progression": weekly_progression,
         "key_dates": {
-            "training_start": db_plan.start_date.isoformat(),
-            "race_date": db_plan.race_date.isoformat(),
-            "created": db_plan.created_at.isoformat()
+            "training_start": db_plan.start_date,
+            "race_date": db_plan.race_date,
+            "created": db_plan.created_at
         }
     }
 
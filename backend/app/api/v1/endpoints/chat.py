@@ -1,10 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Dict, Any, Optional
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, HTTPException, Depends, Response
+from typing import List, Dict, Any, Literal, Optional
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
+import asyncio
+import json
 import logging
+import time
 
-from core.rag.agents import race_buddy_agents
-from core.vector_store import vector_store
+from core.rag.agents import get_agents
+from core.semantic_cache import QuickQuestionCache, chat_response_cache
+from core.vector_store import get_vector_store
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -15,24 +19,32 @@ logger = logging.getLogger(__name__)
 
 
 class ChatMessage(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     role: str = Field(..., description="Role: 'user' or 'assistant'")
     content: str = Field(..., description="Message content")
     timestamp: Optional[str] = Field(None, description="Message timestamp")
 
 
 class ChatRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     message: str = Field(..., description="User message to send to the agent")
     conversation_history: Optional[List[ChatMessage]] = Field(
         default=[],
         description="Previous conversation history"
     )
-    preferred_agent: Optional[str] = Field(
+    # Literal lets Pydantic validate the value with a single membership
+    # check and reject bad input at the request boundary
+    preferred_agent: Optional[Literal["race_expert", "training_coach", "general"]] = Field(
         default=None,
         description="Preferred agent: 'race_expert', 'training_coach', or 'general'"
     )
 
 
 class ChatResponse(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     response: str = Field(..., description="Agent's response")
     agent_used: str = Field(...,
                             description="Which agent provided the response")
@@ -45,10 +57,17 @@ class ChatResponse(BaseModel):
 
 
 class QuickQuestionResponse(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     question: str
     category: str
     suggested_agent: str
 
+
+# Dumps the whole history in one pydantic-core pass instead of a
+# per-message dict comprehension
+_HISTORY_ADAPTER = TypeAdapter(List[ChatMessage])
+
 # ============================================================================
 # CHAT ENDPOINTS
 # ============================================================================
@@ -63,20 +82,55 @@ async def chat_with_agent(request: ChatRequest):
     try:
         logger.info(f"Received chat request: {request.message[:100]}...")
 
+        # Semantic cache: a near-identical question answered recently can
+        # be served without retrieval or LLM generation. Quick questions
+        # get their own non-expiring slot since the frontend repeats
+        # the same eight strings constantly.
+        query_embedding = None
+        faq_index = None
+        try:
+            query_embedding = await chat_response_cache.aembed(request.message)
+
+            faq_index = await quick_question_cache.amatch(query_embedding)
+            cached = quick_question_cache.get(faq_index) \
+                if faq_index is not None else None
+            if cached is None:
+                cached = chat_response_cache.lookup(query_embedding)
+            if cached is not None:
+                return ChatResponse(
+                    response=cached["response"],
+                    agent_used=cached["agent_used"],
+                    success=True,
+                    suggestions=_generate_follow_up_suggestions(
+                        request.message, cached["agent_used"])
+                )
+        except Exception as cache_error:
+            logger.warning(f"Semantic cache unavailable: {cache_error}")
+
         # Convert Pydantic models to dict for agent
         conversation_history = []
         if request.conversation_history:
-            conversation_history = [
-                {"role": msg.role, "content": msg.content}
-                for msg in request.conversation_history
-            ]
+            conversation_history = _HISTORY_ADAPTER.dump_python(
+                request.conversation_history,
+                exclude={"__all__": {"timestamp"}})
 
         # Call agent system
-        result = race_buddy_agents.chat(
+        result = await get_agents().chat(
             user_message=request.message,
             conversation_history=conversation_history
         )
 
+        # Cache successful responses for future near-duplicate questions
+        if result["success"] and query_embedding is not None:
+            entry = {
+                "response": result["response"],
+                "agent_used": result["agent_used"]
+            }
+            if faq_index is not None:
+                quick_question_cache.store(faq_index, entry)
+            else:
+                chat_response_cache.store(query_embedding, entry)
+
         # Generate follow-up question suggestions
         suggestions = _generate_follow_up_suggestions(
             request.message,
@@ -102,55 +156,78 @@ async def chat_with_agent(request: ChatRequest):
         )
 
 
+QUICK_QUESTIONS = [
+    {
+        "question": "Hur lång är banan på Lidingöloppet?",
+        "category": "Loppinformation",
+        "suggested_agent": "race_expert"
+    },
+    {
+        "question": "Vilka är de svåraste partierna på banan?",
+        "category": "Loppinformation",
+        "suggested_agent": "race_expert"
+    },
+    {
+        "question": "Hur ska jag träna inför Lidingöloppet?",
+        "category": "Träning",
+        "suggested_agent": "training_coach"
+    },
+    {
+        "question": "Hur många veckor innan loppet ska jag börja träna?",
+        "category": "Träning",
+        "suggested_agent": "training_coach"
+    },
+    {
+        "question": "Vilken utrustning behöver jag för loppet?",
+        "category": "Utrustning",
+        "suggested_agent": "race_expert"
+    },
+    {
+        "question": "Hur många träningspass per vecka rekommenderas?",
+        "category": "Träning",
+        "suggested_agent": "training_coach"
+    },
+    {
+        "question": "Vad är En Svensk Klassiker?",
+        "category": "Loppinformation",
+        "suggested_agent": "race_expert"
+    },
+    {
+        "question": "Hur tränar jag bäst för terränglopp?",
+        "category": "Träning",
+        "suggested_agent": "training_coach"
+    }
+]
+
+# FAQ cache over the quick-question strings used by /ask above
+quick_question_cache = QuickQuestionCache(
+    [q["question"] for q in QUICK_QUESTIONS])
+
+# Encoded once at import; the endpoint response never changes
+_QUICK_QUESTIONS_JSON = json.dumps(
+    [QuickQuestionResponse(**q).model_dump() for q in QUICK_QUESTIONS],
+    ensure_ascii=False
+).encode("utf-8")
+
+
 @router.get("/quick-questions", response_model=List[QuickQuestionResponse])
 async def get_quick_questions():
     """
     Get predefined quick questions that users can use
     """
-    quick_questions = [
-        {
-            "question": "Hur lång är banan på Lidingöloppet?",
-            "category": "Loppinformation",
-            "suggested_agent": "race_expert"
-        },
-        {
-            "question": "Vilka är de svåraste partierna på banan?",
-            "category": "Loppinformation",
-            "suggested_agent": "race_expert"
-        },
-        {
-            "question": "Hur ska jag träna inför Lidingöloppet?",
-            "category": "Träning",
-            "suggested_agent": "training_coach"
-        },
-        {
-            "question": "Hur många veckor innan loppet ska jag börja träna?",
-            "category": "Träning",
-            "suggested_agent": "training_coach"
-        },
-        {
-            "question": "Vilken utrustning behöver jag för loppet?",
-            "category": "Utrustning",
-            "suggested_agent": "race_expert"
-        },
-        {
-            "question": "Hur många träningspass per vecka rekommenderas?",
-            "category": "Träning",
-            "suggested_agent": "training_coach"
-        },
-        {
-            "question": "Vad är En Svensk Klassiker?",
-            "category": "Loppinformation",
-            "suggested_agent": "race_expert"
-        },
-        {
-            "question": "Hur tränar jag bäst för terränglopp?",
-            "category": "Träning",
-            "suggested_agent": "training_coach"
-        }
-    ]
+    return Response(content=_QUICK_QUESTIONS_JSON, media_type="application/json")
+
+
+# /agent-status cache: status pages poll aggressively, so one upstream
+# status computation is shared by all callers for a few seconds
+_AGENT_STATUS_TTL = 5.0
+_agent_status_cache = {"value": None, "expires": 0.0}
+_agent_status_lock = asyncio.Lock()
+
 
-    return [QuickQuestionResponse(**q) for q in quick_questions]
+def invalidate_agent_status_cache():
+    """Force the next /agent-status call to recompute (e.g. after ingestion)"""
+    _agent_status_cache["expires"] = 0.0
 
 
 @router.get("/agent-status")
@@ -158,12 +235,29 @@ async def get_agent_status():
     """
     Get status for AI agents and vector database
     """
+    if _agent_status_cache["value"] is not None and \
+            time.monotonic() < _agent_status_cache["expires"]:
+        return _agent_status_cache["value"]
+
+    # Single-flight: concurrent callers wait for one computation
+    async with _agent_status_lock:
+        if _agent_status_cache["value"] is not None and \
+                time.monotonic() < _agent_status_cache["expires"]:
+            return _agent_status_cache["value"]
+        return await _compute_agent_status()
+
+
+async def _compute_agent_status():
     try:
-        # Check vector database
-        race_stats = vector_store.get_collection_stats(
-            vector_store.RACE_DATA_COLLECTION)
-        training_stats = vector_store.get_collection_stats(
-            vector_store.TRAINING_COLLECTION)
+        vector_store = get_vector_store()
+
+        # Check vector database - both stat queries run concurrently
+        race_stats, training_stats = await asyncio.gather(
+            asyncio.to_thread(vector_store.get_collection_stats,
+                              vector_store.RACE_DATA_COLLECTION),
+            asyncio.to_thread(vector_store.get_collection_stats,
+                              vector_store.TRAINING_COLLECTION)
+        )
 
         status = {
             "agents": {
@@ -177,10 +271,14 @@ async def get_agent_status():
                 "race_data_documents": race_stats.get("document_count", 0),
                 "training_documents": training_stats.get("document_count", 0)
             },
-            "llm_model": race_buddy_agents.llm.model_name,
+            "llm_model": get_agents().llm.model_name,
             "system_status": "healthy"
         }
 
+        # Only cache healthy responses
+        _agent_status_cache["value"] = status
+        _agent_status_cache["expires"] = time.monotonic() + _AGENT_STATUS_TTL
+
         return status
 
     except Exception as e:
@@ -194,21 +292,32 @@ async def get_agent_status():
 
 
 @router.post("/search-knowledge")
-async def search_knowledge_base(query: str, category: str = "all"):
+async def search_knowledge_base(query: str, category: Literal["race", "training", "all"] = "all"):
     """
     Search directly in the knowledge base without using agents
     """
     try:
-        if category == "race" or category == "all":
-            race_results = vector_store.query_race_data(query, n_results=3)
-        else:
-            race_results = []
+        vector_store = get_vector_store()
+
+        # Run both collection searches concurrently on the native async
+        # path, so the "all" path costs max(t_race, t_training) instead
+        # of the sum
+        race_task = None
+        training_task = None
 
-        if category == "training" or category == "all":
-            training_results = vector_store.query_training_data(
+        if category in ("race", "all"):
+            race_task = vector_store.aquery_race_data(query, n_results=3)
+
+        if category in ("training", "all"):
+            training_task = vector_store.aquery_training_data(
                 query, n_results=3)
+
+        if race_task and training_task:
+            race_results, training_results = await asyncio.gather(
+                race_task, training_task)
         else:
-            training_results = []
+            race_results = await race_task if race_task else []
+            training_results = await training_task if training_task else []
 
         return {
             "query": query,
@@ -229,28 +338,26 @@ async def search_knowledge_base(query: str, category: str = "all"):
 # ============================================================================
 
 
+# Follow-up suggestions per agent, built once at import (max 3 per agent)
+_FOLLOW_UPS: Dict[str, tuple] = {
+    "race_expert": (
+        "Vilken utrustning rekommenderar du för loppet?",
+        "Hur ser höjdprofilen ut på banan?",
+        "Vilka är de vanligaste misstagen på Lidingöloppet?"
+    ),
+    "training_coach": (
+        "Hur många veckor innan loppet ska jag börja träna?",
+        "Vilka träningspass är viktigast för terränglopp?",
+        "Hur tränar jag bäst för backar?"
+    ),
+    "general": (
+        "Berätta mer om Lidingöloppet",
+        "Hur ska jag träna inför loppet?",
+        "Vad är En Svensk Klassiker?"
+    )
+}
+
+
 def _generate_follow_up_suggestions(user_message: str, agent_used: str) -> List[str]:
     """Generate follow-up question suggestions based on user's question and agent"""
-
-    suggestions = []
-
-    if agent_used == "race_expert":
-        suggestions = [
-            "Vilken utrustning rekommenderar du för loppet?",
-            "Hur ser höjdprofilen ut på banan?",
-            "Vilka är de vanligaste misstagen på Lidingöloppet?"
-        ]
-    elif agent_used == "training_coach":
-        suggestions = [
-            "Hur många veckor innan loppet ska jag börja träna?",
-            "Vilka träningspass är viktigast för terränglopp?",
-            "Hur tränar jag bäst för backar?"
-        ]
-    else:
-        suggestions = [
-            "Berätta mer om Lidingöloppet",
-            "Hur ska jag träna inför loppet?",
-            "Vad är En Svensk Klassiker?"
-        ]
-
-    return suggestions[:3]  # Max 3 suggestions
+    return list(_FOLLOW_UPS.get(agent_used, _FOLLOW_UPS["general"]))
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from typing import List, Dict, Any
 from core.schemas import RaceInfo
+import json
 
 router = APIRouter()
 
@@ -12,9 +13,9 @@ RACE_DATA = {
         distance_km=30.0,
         location="Lidingö, Stockholm",
         description="""
-        Lidingöloppet är en av Sveriges mest traditionsrika terrängtävlingar och en av hörnstenarna 
-        i En Svensk Klassiker. Loppet går genom Lidingös varierade terräng med både skogspartier, 
-        klippor och öppna marker. Med sina 30 kilometer och cirka 400 meters höjdskillnad 
+        Lidingöloppet är en av Sveriges mest traditionsrika terrängtävlingar och en av hörnstenarna
+        i En Svensk Klassiker. Loppet går genom Lidingös varierade terräng med både skogspartier,
+        klippor och öppna marker. Med sina 30 kilometer och cirka 400 meters höjdskillnad
         är det en utmaning som kräver både uthållighet och teknisk skicklighet.
         """.strip(),
         elevation_gain_m=400,
@@ -29,11 +30,117 @@ RACE_DATA = {
     )
 }
 
+# Hardcoded tips for Lidingöloppet
+RACE_TIPS = {
+    "training_tips": [
+        {
+            "category": "Teknisk träning",
+            "tip": "Träna regelbundet på teknisk terräng med rötter och stenar",
+            "rationale": "Lidingöloppet har många tekniska sektioner som kräver vana"
+        },
+        {
+            "category": "Backträning",
+            "tip": "Inkludera långa, stadiga uppförsbackar i träningen",
+            "rationale": "Loppet har flera längre klättringar som kräver god backstyrka"
+        },
+        {
+            "category": "Långa pass",
+            "tip": "Bygg upp till pass på 2-2.5 timmar för att hantera distansen",
+            "rationale": "30km kräver god grunduthållighet och mental styrka"
+        }
+    ],
+    "race_day_tips": [
+        {
+            "category": "Utrustning",
+            "tip": "Använd terrängskor med bra grepp, även om det är torrt",
+            "rationale": "Klipporna kan vara hala även utan regn"
+        },
+        {
+            "category": "Taktik",
+            "tip": "Hål igen de första 10km och spara energi till slutet",
+            "rationale": "Många går ut för fort och får problem senare i loppet"
+        },
+        {
+            "category": "Nutrition",
+            "tip": "Ta med energi för minst 2.5 timmar, även om du siktar på snabbare tid",
+            "rationale": "Teknisk terräng kan göra att du blir långsammare än planerat"
+        }
+    ],
+    "weather_preparation": [
+        {
+            "condition": "Regn",
+            "advice": "Extra försiktighet på klippor, kortare steg i tekniska partier"
+        },
+        {
+            "condition": "Kallt väder",
+            "advice": "Klä dig i lager, du kommer bli varm under loppet"
+        },
+        {
+            "condition": "Vind",
+            "advice": "Vindskydd kan behövas vid öppna partier, särskilt på Långängen"
+        }
+    ]
+}
+
+# Simulated statistics (later from real data)
+RACE_STATISTICS = {
+    "participation": {
+        "average_participants": 15000,
+        "completion_rate": 0.92,
+        "growth_trend": "stable"
+    },
+    "finish_times": {
+        "men": {
+            "average": "2:45:30",
+            "median": "2:42:15",
+            "25th_percentile": "2:28:00",
+            "75th_percentile": "3:05:00"
+        },
+        "women": {
+            "average": "3:15:20",
+            "median": "3:12:45",
+            "25th_percentile": "2:55:00",
+            "75th_percentile": "3:38:00"
+        }
+    },
+    "age_groups": {
+        "20-29": {"avg_time": "2:35:00", "participants": 2500},
+        "30-39": {"avg_time": "2:42:00", "participants": 4200},
+        "40-49": {"avg_time": "2:55:00", "participants": 4800},
+        "50-59": {"avg_time": "3:12:00", "participants": 2800},
+        "60+": {"avg_time": "3:45:00", "participants": 700}
+    },
+    "common_splits": {
+        "10km": "52:30",
+        "20km": "1:48:20",
+        "25km": "2:18:45",
+        "finish": "2:55:00"
+    }
+}
+
+
+def _encode(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+# All race endpoints serve constant data - encode responses once at import
+# instead of re-serializing identical dicts on every request
+_RACE_LIST_JSON = _encode([race.dict() for race in RACE_DATA.values()])
+_RACE_INFO_JSON = {
+    race_id: _encode(race.dict()) for race_id, race in RACE_DATA.items()
+}
+_RACE_TIPS_JSON = _encode(RACE_TIPS)
+_RACE_STATISTICS_JSON = _encode(RACE_STATISTICS)
+
+
+def _json_response(content: bytes) -> Response:
+    return Response(content=content, media_type="application/json")
+
 
 @router.get("/", response_model=List[RaceInfo])
 async def list_races():
     """List all available races"""
-    return list(RACE_DATA.values())
+    return _json_response(_RACE_LIST_JSON)
 
 
 @router.get("/{race_id}", response_model=RaceInfo)
@@ -46,7 +153,7 @@ async def get_race_info(race_id: str):
             detail=f"Race '{race_id}' not found. Available races: {list(RACE_DATA.keys())}"
         )
 
-    return RACE_DATA[race_id]
+    return _json_response(_RACE_INFO_JSON[race_id])
 
 
 @router.get("/{race_id}/tips", response_model=Dict[str, Any])
@@ -57,59 +164,7 @@ async def get_race_tips(race_id: str):
         raise HTTPException(
             status_code=404, detail=f"Race '{race_id}' not found")
 
-    # Hardcoded tips for Lidingöloppet
-    tips = {
-        "training_tips": [
-            {
-                "category": "Teknisk träning",
-                "tip": "Träna regelbundet på teknisk terräng med rötter och stenar",
-                "rationale": "Lidingöloppet har många tekniska sektioner som kräver vana"
-            },
-            {
-                "category": "Backträning",
-                "tip": "Inkludera långa, stadiga uppförsbackar i träningen",
-                "rationale": "Loppet har flera längre klättringar som kräver god backstyrka"
-            },
-            {
-                "category": "Långa pass",
-                "tip": "Bygg upp till pass på 2-2.5 timmar för att hantera distansen",
-                "rationale": "30km kräver god grunduthållighet och mental styrka"
-            }
-        ],
-        "race_day_tips": [
-            {
-                "category": "Utrustning",
-                "tip": "Använd terrängskor med bra grepp, även om det är torrt",
-                "rationale": "Klipporna kan vara hala även utan regn"
-            },
-            {
-                "category": "Taktik",
-                "tip": "Hål igen de första 10km och spara energi till slutet",
-                "rationale": "Många går ut för fort och får problem senare i loppet"
-            },
-            {
-                "category": "Nutrition",
-                "tip": "Ta med energi för minst 2.5 timmar, även om du siktar på snabbare tid",
-                "rationale": "Teknisk terräng kan göra att du blir långsammare än planerat"
-            }
-        ],
-        "weather_preparation": [
-            {
-                "condition": "Regn",
-                "advice": "Extra försiktighet på klippor, kortare steg i tekniska partier"
-            },
-            {
-                "condition": "Kallt väder",
-                "advice": "Klä dig i lager, du kommer bli varm under loppet"
-            },
-            {
-                "condition": "Vind",
-                "advice": "Vindskydd kan behövas vid öppna partier, särskilt på Långängen"
-            }
-        ]
-    }
-
-    return tips
+    return _json_response(_RACE_TIPS_JSON)
 
 
 @router.get("/{race_id}/statistics", response_model=Dict[str, Any])
@@ -120,40 +175,4 @@ async def get_race_statistics(race_id: str):
         raise HTTPException(
             status_code=404, detail=f"Race '{race_id}' not found")
 
-    # Simulated statistics (later from real data)
-    statistics = {
-        "participation": {
-            "average_participants": 15000,
-            "completion_rate": 0.92,
-            "growth_trend": "stable"
-        },
-        "finish_times": {
-            "men": {
-                "average": "2:45:30",
-                "median": "2:42:15",
-                "25th_percentile": "2:28:00",
-                "75th_percentile": "3:05:00"
-            },
-            "women": {
-                "average": "3:15:20",
-                "median": "3:12:45",
-                "25th_percentile": "2:55:00",
-                "75th_percentile": "3:38:00"
-            }
-        },
-        "age_groups": {
-            "20-29": {"avg_time": "2:35:00", "participants": 2500},
-            "30-39": {"avg_time": "2:42:00", "participants": 4200},
-            "40-49": {"avg_time": "2:55:00", "participants": 4800},
-            "50-59": {"avg_time": "3:12:00", "participants": 2800},
-            "60+": {"avg_time": "3:45:00", "participants": 700}
-        },
-        "common_splits": {
-            "10km": "52:30",
-            "20km": "1:48:20",
-            "25km": "2:18:45",
-            "finish": "2:55:00"
-        }
-    }
-
-    return statistics
+    return _json_response(_RACE_STATISTICS_JSON)
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from pydantic import RootModel
+from sqlalchemy.orm import Session, undefer
 from typing import List, Dict, Any
+import asyncio
 import uuid
 from datetime import datetime, date
 import logging
@@ -11,32 +13,130 @@ from core.schemas import (
     TrainingPlanResponse,
     MessageResponse
 )
-from core.training_logic import ai_training_generator, training_generator
+from core.ics_utils import generate_ics_file
+from core.training_logic import (
+    ai_training_generator,
+    generate_plan_cached,
+    training_generator
+)
 from db.session import get_db
 from db.models import TrainingPlan
 
 router = APIRouter()
 
+# Standard calendar slot for every training session
+TIME_START = "11:00"
+TIME_END = "12:00"
+
+
+# Serializes the nested plan structure (dicts, lists, Pydantic models,
+# date/datetime) in one pydantic-core pass instead of a Python-level
+# recursion over every field
+_PlanData = RootModel[Dict[str, Any]]
+
 
 def serialize_plan_data(plan_data):
-    """Converts Pydantic objects to JSON-serializable data"""
-    def convert_obj(obj):
-        if isinstance(obj, date):  # Handle date objects
-            return obj.isoformat()
-        elif isinstance(obj, datetime):  # Handle datetime objects
-            return obj.isoformat()
-        elif hasattr(obj, 'dict'):  # Pydantic model
-            return convert_obj(obj.dict())
-        elif hasattr(obj, '__dict__'):
-            return {key: convert_obj(value) for key, value in obj.__dict__.items()}
-        elif isinstance(obj, (list, tuple)):
-            return [convert_obj(item) for item in obj]
-        elif isinstance(obj, dict):
-            return {key: convert_obj(value) for key, value in obj.items()}
-        else:
-            return obj
-
-    return convert_obj(plan_data)
+    """Converts plan data to JSON-serializable data"""
+    return _PlanData.model_validate(plan_data).model_dump(mode="json")
+
+
+def compute_plan_aggregates(plan_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Computes summary aggregates (session distribution, weekly progression)
+    from serialized plan data, so summary reads become a plain row fetch"""
+
+    session_types = {}
+    weekly_progression = []
+
+    for week in plan_data.get("weeks", []):
+        for session in week.get("sessions", []):
+            session_type = session.get("type", "Unknown")
+            session_types[session_type] = session_types.get(
+                session_type, 0) + 1
+
+        weekly_progression.append({
+            "week": week.get("week_number"),
+            "distance": int(week.get("total_distance_km")),
+            "focus": week.get("focus")
+        })
+
+    return {
+        "session_distribution": session_types,
+        "weekly_progression": weekly_progression
+    }
+
+
+def _format_calendar_sessions(plan_data: Dict[str, Any],
+                              request: TrainingPlanRequest) -> List[Dict[str, Any]]:
+    """Formats the generated weeks for the calendar view.
+
+    Loop invariants are hoisted and strftime results cached per date; a
+    20-week plan repeats the same handful of values hundreds of times
+    otherwise.
+    """
+    calendar_sessions = []
+    race_value = request.race.value
+    default_fokus = f"Träning för {race_value}"
+    date_cache = {}
+
+    for week in plan_data["weeks"]:
+        week_number = week.week_number
+        week_focus = week.focus
+        for session in week.sessions:
+            formatted = date_cache.get(session.date)
+            if formatted is None:
+                formatted = date_cache.setdefault(session.date, (
+                    session.date.isoformat(),
+                    session.date.strftime("%A").upper(),
+                    session.date.strftime("%-d %B").upper()  # "4 JUNE"
+                ))
+            iso_date, day_name, day_date = formatted
+
+            calendar_sessions.append({
+                "date": iso_date,
+                "day_name": day_name,
+                "day_date": day_date,
+                "pass": session.description,  # Title in the calendar
+                "fokus": session.notes or default_fokus,  # Description
+                "time_start": TIME_START,
+                "time_end": TIME_END,
+                "distance_km": session.distance_km,
+                "pace": session.pace,
+                "type": session.type,
+                "intensity": session.intensity,
+                "week_number": week_number,
+                "week_focus": week_focus
+            })
+
+    return calendar_sessions
+
+
+def _build_plan_response(plan_data: Dict[str, Any], request: TrainingPlanRequest,
+                         fallback_used: bool = False) -> Dict[str, Any]:
+    """Builds the full /generate-ai-plan response for either generator path"""
+    response = {
+        "success": True,
+        "user_data": {
+            "gender": request.gender.value,
+            "age": request.age,
+            "fitness_level": request.fitness_level.value,
+            "target_time": request.target_time,
+            "race": request.race.value,
+            "training_days_per_week": request.training_days_per_week
+        },
+        "plan_summary": {
+            "total_weeks": plan_data["total_weeks"],
+            "total_distance_km": plan_data["total_distance_km"],
+            "start_date": request.start_date.isoformat(),
+            "race_date": request.race_date.isoformat()
+        },
+        "calendar_sessions": _format_calendar_sessions(plan_data, request),
+        "raw_plan_data": plan_data,  # For .ics export
+        "generated_at": datetime.now().isoformat()
+    }
+    if fallback_used:
+        response["fallback_used"] = True
+    return response
+
 
 
 @router.post("/generate-ai-plan")
@@ -48,58 +148,15 @@ async def generate_ai_training_plan(request: TrainingPlanRequest):
     try:
         logging.info("Generating AI-enhanced training plan...")
 
-        # Use AI-enhanced generator
-        plan_data = ai_training_generator.generate_plan(request)
-
-        # Format for calendar view (same format as in the image)
-        calendar_sessions = []
-
-        for week in plan_data["weeks"]:
-            for session in week.sessions:
-                # Format as in calendar image
-                calendar_session = {
-                    "date": session.date.isoformat(),
-                    "day_name": session.date.strftime("%A").upper(),
-                    # "4 JUNE"
-                    "day_date": session.date.strftime("%-d %B").upper(),
-                    "pass": session.description,  # This becomes the title in the calendar
-                    # This becomes the description
-                    "fokus": session.notes or f"Träning för {request.race.value}",
-                    "time_start": "11:00",  # Standard time
-                    "time_end": "12:00",
-                    "distance_km": session.distance_km,
-                    "pace": session.pace,
-                    "type": session.type,
-                    "intensity": session.intensity,
-                    "week_number": week.week_number,
-                    "week_focus": week.focus
-                }
-                calendar_sessions.append(calendar_session)
-
-        # Response structure
-        response = {
-            "success": True,
-            "user_data": {
-                "gender": request.gender.value,
-                "age": request.age,
-                "fitness_level": request.fitness_level.value,
-                "target_time": request.target_time,
-                "race": request.race.value,
-                "training_days_per_week": request.training_days_per_week
-            },
-            "plan_summary": {
-                "total_weeks": plan_data["total_weeks"],
-                "total_distance_km": plan_data["total_distance_km"],
-                "start_date": request.start_date.isoformat(),
-                "race_date": request.race_date.isoformat()
-            },
-            "calendar_sessions": calendar_sessions,  # For calendar view
-            "raw_plan_data": plan_data,  # For .ics export
-            "generated_at": datetime.now().isoformat()
-        }
+        # Use AI-enhanced generator; generation is CPU/LLM-bound, so
+        # run it off the event loop
+        plan_data = await asyncio.to_thread(
+            generate_plan_cached, ai_training_generator, request)
+
+        response = _build_plan_response(plan_data, request)
 
         logging.info(
-            f"AI training plan generated successfully with {len(calendar_sessions)} sessions")
+            f"AI training plan generated successfully with {len(response['calendar_sessions'])} sessions")
         return response
 
     except Exception as e:
@@ -108,50 +165,10 @@ async def generate_ai_training_plan(request: TrainingPlanRequest):
         # Fallback to standard generator
         try:
             logging.info("Falling back to standard training plan generator...")
-            plan_data = training_generator.generate_plan(request)
-
-            # Same formatting for fallback
-            calendar_sessions = []
-            for week in plan_data["weeks"]:
-                for session in week.sessions:
-                    calendar_session = {
-                        "date": session.date.isoformat(),
-                        "day_name": session.date.strftime("%A").upper(),
-                        "day_date": session.date.strftime("%-d %B").upper(),
-                        "pass": session.description,
-                        "fokus": session.notes or f"Träning för {request.race.value}",
-                        "time_start": "11:00",
-                        "time_end": "12:00",
-                        "distance_km": session.distance_km,
-                        "pace": session.pace,
-                        "type": session.type,
-                        "intensity": session.intensity,
-                        "week_number": week.week_number,
-                        "week_focus": week.focus
-                    }
-                    calendar_sessions.append(calendar_session)
-
-            return {
-                "success": True,
-                "fallback_used": True,
-                "user_data": {
-                    "gender": request.gender.value,
-                    "age": request.age,
-                    "fitness_level": request.fitness_level.value,
-                    "target_time": request.target_time,
-                    "race": request.race.value,
-                    "training_days_per_week": request.training_days_per_week
-                },
-                "plan_summary": {
-                    "total_weeks": plan_data["total_weeks"],
-                    "total_distance_km": plan_data["total_distance_km"],
-                    "start_date": request.start_date.isoformat(),
-                    "race_date": request.race_date.isoformat()
-                },
-                "calendar_sessions": calendar_sessions,
-                "raw_plan_data": plan_data,
-                "generated_at": datetime.now().isoformat()
-            }
+            plan_data = await asyncio.to_thread(
+                generate_plan_cached, training_generator, request)
+
+            return _build_plan_response(plan_data, request, fallback_used=True)
 
         except Exception as fallback_error:
             logging.error(
@@ -168,15 +185,16 @@ async def generate_ics_from_plan_data(plan_data: Dict[str, Any]):
     Generate .ics file from plan data
     """
     try:
-        from core.ics_utils import generate_ics_file
-
         # Extract info from plan data
         race_name = plan_data.get("user_data", {}).get("race", "Lidingöloppet")
         race_date = datetime.fromisoformat(
             plan_data.get("plan_summary", {}).get("race_date"))
 
-        # Generate ICS content
-        ics_content = generate_ics_file(
+        # Generate ICS content off the event loop; the string assembly
+        # is synchronous CPU work and would otherwise block other
+        # requests for the duration (the calendar export streams instead)
+        ics_content = await asyncio.to_thread(
+            generate_ics_file,
             plan_data=plan_data.get("raw_plan_data", {}),
             plan_id=str(uuid.uuid4()),
             race_name=race_name,
@@ -205,21 +223,35 @@ async def create_training_plan(
         # Try first with AI-enhanced generator
         try:
             logging.info("Generating AI-enhanced training plan...")
-            plan_data = ai_training_generator.generate_plan(request)
+            plan_data = await asyncio.to_thread(
+                generate_plan_cached, ai_training_generator, request)
             logging.info("AI-enhanced training plan generated successfully")
         except Exception as ai_error:
             logging.warning(
                 f"AI training plan failed, using fallback: {ai_error}")
             # Fallback to standard generator if AI fails
-            plan_data = training_generator.generate_plan(request)
+            plan_data = await asyncio.to_thread(
+                generate_plan_cached, training_generator, request)
 
-        # Convert to JSON-serializable data
+        # Convert to JSON-serializable data; this one dict is the
+        # canonical form used for both the DB row and the response
         serializable_plan_data = serialize_plan_data(plan_data)
+        total_weeks = plan_data["total_weeks"]
+        total_distance_km = plan_data["total_distance_km"]
+
+        # Drop the Pydantic tree early so only the serialized form
+        # stays alive through the commit
+        del plan_data
+
+        # Precompute summary aggregates once at write time
+        aggregates = compute_plan_aggregates(serializable_plan_data)
 
         # Create unique ID
         plan_id = str(uuid.uuid4())
 
         # Save to database
+        created_at = datetime.now()
+
         db_plan = TrainingPlan(
             id=plan_id,
             gender=request.gender.value,
@@ -235,23 +267,30 @@ async def create_training_plan(
             previous_race_times=request.previous_race_times,
             injuries=request.injuries,
             plan_data=serializable_plan_data,  # Use serialized data
-            total_weeks=plan_data["total_weeks"],
-            total_distance_km=plan_data["total_distance_km"]
+            total_weeks=total_weeks,
+            total_distance_km=total_distance_km,
+            session_distribution=aggregates["session_distribution"],
+            weekly_progression=aggregates["weekly_progression"],
+            race_display_name=request.race.value.title() + "löppet",
+            ics_filename=f"training_plan_{request.race.value}_{plan_id[:8]}.ics",
+            # Set in Python instead of relying on the server default so
+            # no refresh round-trip is needed after the insert
+            created_at=created_at
         )
 
         db.add(db_plan)
-        db.commit()
-        db.refresh(db_plan)
+        await asyncio.to_thread(db.commit)
 
-        # Convert back for response
-        response = TrainingPlanResponse(
+        # Build the response from the same serialized dict without
+        # re-validating it (model_construct skips validation)
+        response = TrainingPlanResponse.model_construct(
             id=plan_id,
             user_data=request,
-            weeks=plan_data["weeks"],  # Use original data for response
-            total_weeks=plan_data["total_weeks"],
-            total_distance_km=plan_data["total_distance_km"],
+            weeks=serializable_plan_data["weeks"],
+            total_weeks=total_weeks,
+            total_distance_km=total_distance_km,
             ics_download_url=f"/v1/calendar/plans/{plan_id}/export/ics",
-            created_at=datetime.now()
+            created_at=created_at
         )
 
         logging.info(f"Training plan created successfully: {plan_id}")
@@ -267,7 +306,10 @@ async def create_training_plan(
 async def get_training_plan(plan_id: str, db: Session = Depends(get_db)):
     """Get a specific training plan"""
 
-    db_plan = db.query(TrainingPlan).filter(TrainingPlan.id == plan_id).first()
+    # Session.get() hits the identity map first and skips Query
+    # construction; the response needs plan_data, so undefer it up front
+    db_plan = db.get(TrainingPlan, plan_id,
+                     options=[undefer(TrainingPlan.plan_data)])
 
     if not db_plan:
         raise HTTPException(status_code=404, detail="Training plan not found")
@@ -315,28 +357,36 @@ async def list_training_plans(
 ):
     """List training plans (for admin/debug)"""
 
-    plans = db.query(TrainingPlan).offset(offset).limit(limit).all()
-
-    result = []
-    for plan in plans:
-        result.append({
-            "id": plan.id,
-            "race": plan.race,
-            "target_time": plan.target_time,
-            "fitness_level": plan.fitness_level,
-            "total_weeks": plan.total_weeks,
-            "total_distance_km": plan.total_distance_km,
-            "created_at": plan.created_at.isoformat()
-        })
-
-    return result
+    # Select only the listed columns: a full ORM load would also decode
+    # every plan_data JSON blob just to throw it away
+    plans = db.query(
+        TrainingPlan.id,
+        TrainingPlan.race,
+        TrainingPlan.target_time,
+        TrainingPlan.fitness_level,
+        TrainingPlan.total_weeks,
+        TrainingPlan.total_distance_km,
+        TrainingPlan.created_at
+    ).order_by(TrainingPlan.created_at.desc()).offset(offset).limit(limit).all()
+
+    return [{
+        "id": plan.id,
+        "race": plan.race,
+        "target_time": plan.target_time,
+        "fitness_level": plan.fitness_level,
+        "total_weeks": plan.total_weeks,
+        "total_distance_km": plan.total_distance_km,
+        "created_at": plan.created_at.isoformat()
+    } for plan in plans]
 
 
 @router.delete("/plans/{plan_id}", response_model=MessageResponse)
 async def delete_training_plan(plan_id: str, db: Session = Depends(get_db)):
     """Delete a training plan"""
 
-    db_plan = db.query(TrainingPlan).filter(TrainingPlan.id == plan_id).first()
+    # Deleting never needs the plan body, so the deferred plan_data
+    # column is never loaded here
+    db_plan = db.get(TrainingPlan, plan_id)
 
     if not db_plan:
         raise HTTPException(status_code=404, detail="Training plan not found")
@@ -0,0 +1,46 @@
+"""Numerical kernels for training plan generation.
+
+The periodization multiplier is the only numerical kernel in plan
+generation. When numba is available the loop is JIT-compiled once
+(with an on-disk cache) so batch workloads recomputing many plans pay
+near-C cost per call; without numba the vectorized numpy fallback
+keeps identical semantics.
+"""
+import math
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the numpy path serves online use
+    njit = None
+
+
+def _week_multipliers_np(total_weeks: int) -> np.ndarray:
+    p = np.arange(1, total_weeks + 1, dtype=np.float64) / total_weeks
+    return np.where(
+        p <= 0.3, 0.7 + p,
+        np.where(p <= 0.7, 1.0 + 0.3 * np.sin((p - 0.3) * np.pi / 0.4),
+                 np.where(p <= 0.9, 1.0, 0.6)))
+
+
+if njit is not None:
+    @njit(cache=True)
+    def week_multipliers(total_weeks: int) -> np.ndarray:
+        out = np.empty(total_weeks)
+        for i in range(total_weeks):
+            p = (i + 1) / total_weeks
+            if p <= 0.3:
+                out[i] = 0.7 + p
+            elif p <= 0.7:
+                out[i] = 1.0 + 0.3 * math.sin((p - 0.3) * math.pi / 0.4)
+            elif p <= 0.9:
+                out[i] = 1.0
+            else:
+                out[i] = 0.6
+        return out
+
+    # Warm-start so the one-time JIT cost lands at import, not on the
+    # first plan request
+    week_multipliers(1)
+else:
+    week_multipliers = _week_multipliers_np
@@ -1,23 +1,170 @@
 import pandas as pd
 import json
 import logging
+import re
 from pathlib import Path
 from typing import List, Dict, Any
 from datetime import datetime
-import uuid
+from secrets import token_hex
 
-from core.vector_store import vector_store
+from core.vector_store import get_vector_store
 from settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Important terms for Lidingöloppet, matched in one scan via a single
+# compiled alternation (longest alternatives first so multi-word terms
+# like "praktisk information" win over their prefixes)
+_KEY_TERMS = [
+    'anmälan', 'startinformation', 'resultat', 'praktisk information',
+    'partners', 'nyheter', 'sportmässa', 'svenska klassiker',
+    'cykling', 'simning', 'löpning', 'skidåkning',
+    'vasaloppet', 'vätternrundan', 'vansbrosimningen',
+    'träning', 'förberedelse', 'utrustning', 'nutrition',
+    'väder', 'bana', 'höjdmeter', 'distans'
+]
+_KEY_TERMS_RE = re.compile(
+    "|".join(re.escape(t) for t in
+             sorted(_KEY_TERMS, key=len, reverse=True)),
+    re.IGNORECASE)
+
+
+# Basic training guides, built once at import; the string literals are
+# several KB each and never change between calls
+_TRAINING_GUIDELINES = (
+    {
+        'title': 'Grundträning för Lidingöloppet',
+        'content': """
+GRUNDTRÄNING FÖR LIDINGÖLOPPET (30KM TERRÄNGLOPP)
+
+TRÄNINGSPERIOD: 12-20 veckor före loppet
+
+GRUNDLÄGGANDE PRINCIPER:
+- Bygg upp gradvis volym och intensitet
+- 80% av träningen ska vara i låg intensitet
+- 20% kan vara medium till hög intensitet
+- Vila är lika viktigt som träning
+
+VECKOSTRUKTUR:
+- 3-4 träningspass per vecka för nybörjare
+- 4-6 träningspass per vecka för erfarna
+- Minst en vilodag mellan hårda pass
+
+TRÄNINGSTYPER:
+1. Grundträning (lätt jogging): 60-80% av träningen
+2. Tempoträning (medel intensitet): 10-15% av träningen  
+3. Intervallträning (hög intensitet): 5-10% av träningen
+4. Lågpass (mycket lätt): 10-15% av träningen
+
+SPECIFIKT FÖR LIDINGÖLOPPET:
+- Träna regelbundet i terräng
+- Öva backspring och backgång
+- Träna balans och koordination på teknisk mark
+- Bygg upp till 2-2.5 timmar längsta pass
+        """,
+        'topics': ['grundträning', 'periodisering', 'träningstyper']
+    },
+    {
+        'title': 'Specifik träning för Lidingöloppets terräng',
+        'content': """
+TERRÄNGSPECIFIK TRÄNING FÖR LIDINGÖLOPPET
+
+LIDINGÖLOPPETS UTMANINGAR:
+- 30 km distans med ca 400 höjdmeter
+- Tekniska klipppartier kilometer 8-12
+- Lång uppförsbacke vid kilometer 15
+- Halt underlag vid regn
+- Tät skog med rotiga stigar
+
+SPECIFIKA TRÄNINGSOMRÅDEN:
+
+1. BACKTRÄNING:
+- Korta, branta backar för kraft (30-60 sekunder)
+- Långa, måttliga backar för uthållighet (3-8 minuter)
+- Träna både uppför och nedför
+- Fokus på teknik och effektivitet
+
+2. TEKNISK TRÄNING:
+- Träna på rötter, stenar och ojämn mark
+- Balansträning på instabil yta
+- Koordinationsövningar
+- Träna med olika underlag (torrt/blött)
+
+3. MENTALA FÖRBEREDELSER:
+- Långa pass i tuff terräng
+- Träna i olika väderförhållanden  
+- Öva nutrition och vätskeintag under löpning
+- Visualisering av loppet
+
+REKOMMENDERADE TRÄNINGSPLATSER:
+- Teknisk skogsterräng
+- Klippiga områden (försiktigt!)
+- Varierad terräng med både backar och flacka partier
+        """,
+        'topics': ['terrängträning', 'backträning', 'teknik', 'mental träning']
+    },
+    {
+        'title': 'Tävlingsförberedelse och strategi',
+        'content': """
+TÄVLINGSFÖRBEREDELSE FÖR LIDINGÖLOPPET
+
+3 VECKOR FÖRE LOPPET:
+- Minska träningsvolymen gradvis
+- Behåll intensiteten i små doser
+- Fokus på återhämtning och hälsa
+- Testa all utrustning
+
+VECKAN FÖRE LOPPET:
+- Lätta joggingpass, max 45-60 minuter
+- 2-3 korta tempointervaller (håll kroppen vaken)
+- Extra sömn och bra kost
+- Undvik nya aktiviteter
+
+LOPPSTRATEGI:
+
+START (0-5 km):
+- Starta försiktigt, låt kroppen värma upp
+- Följ inte med i för högt tempo från start
+- Spara energi för senare delen
+
+MITTENDELEN (5-20 km):
+- Hitta din rytm och håll den
+- Var extra försiktig i tekniska partier
+- Tänk på vätskeintag var 5:e km
+- Använd energi vid uppmuntringsposter
+
+SLUTDELEN (20-30 km):
+- Här avgörs loppet - nu får du använda sparad energi
+- Fokus på teknik även när du blir trött
+- Positiv inställning och kämparglöd
+- Tänk på målgång och känslan av att vara klar!
+
+UTRUSTNING:
+- Terrängskor med bra grepp
+- Fungerande kläder (inga nya på loppdag!)
+- Energi för 2.5-3 timmar
+- Huvudbonad och handdukar vid växlingar
+        """,
+        'topics': ['tävlingsförberedelse', 'loppstrategi', 'utrustning', 'mental förberedelse']
+    }
+)
+
+# Pre-join the topics string once per guide
+for _guide in _TRAINING_GUIDELINES:
+    _guide['topics_str'] = ', '.join(_guide['topics'])
+
 
 class LidingoDataIngestion:
     """Class for processing and importing Lidingöloppet CSV data into ChromaDB"""
 
     def __init__(self):
         self.csv_path = Path(settings.CSV_DATA_FILE)
-        self.vector_store = vector_store
+
+    @property
+    def vector_store(self):
+        # Resolved per use so the import-time singleton below does not
+        # force the store (and Chroma) open at import
+        return get_vector_store()
 
     def load_and_process_csv(self) -> pd.DataFrame:
         """Load and process the CSV file"""
@@ -25,8 +172,22 @@ class LidingoDataIngestion:
             if not self.csv_path.exists():
                 raise FileNotFoundError(f"CSV file not found: {self.csv_path}")
 
-            # Read CSV file
-            df = pd.read_csv(self.csv_path)
+            # Only these columns are ever read downstream; sniff the
+            # header so a file missing some of them still loads
+            wanted = ['url', 'content', 'title', 'content_type']
+            header = pd.read_csv(self.csv_path, nrows=0)
+            usecols = [c for c in wanted if c in header.columns]
+
+            # Arrow's C++ CSV reader parses multi-MB files several
+            # times faster than the default engine; fall back if the
+            # installed pandas/pyarrow combination can't handle it
+            dtypes = {c: 'string' for c in usecols}
+            try:
+                df = pd.read_csv(self.csv_path, engine="pyarrow",
+                                 usecols=usecols or None, dtype=dtypes)
+            except (ImportError, ValueError):
+                df = pd.read_csv(self.csv_path, usecols=usecols or None,
+                                 dtype=dtypes)
             logger.info(
                 f"Loaded CSV with {len(df)} rows and {len(df.columns)} columns")
 
@@ -43,7 +204,8 @@ class LidingoDataIngestion:
             logger.error(f"Error loading CSV: {e}")
             raise
 
-    def create_race_documents(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+    def create_race_documents(self, df: pd.DataFrame,
+                              now_iso: str) -> List[Dict[str, Any]]:
         """Create documents from race data for the vector database"""
         documents = []
 
@@ -58,18 +220,18 @@ class LidingoDataIngestion:
                     'type': 'race_overview',
                     'race': 'lidingo',
                     'data_source': 'scraped_web',
-                    'created_at': datetime.now().isoformat()
+                    'created_at': now_iso
                 },
-                'id': f"race_overview_{uuid.uuid4().hex[:8]}"
+                'id': f"race_overview_{token_hex(4)}"
             })
 
             # 2. Detailed content analysis per URL (if URL column exists)
             if 'url' in df.columns and 'content' in df.columns:
-                url_docs = self._create_url_documents(df)
+                url_docs = self._create_url_documents(df, now_iso)
                 documents.extend(url_docs)
 
             # 3. Create thematic documents
-            thematic_docs = self._create_thematic_documents(df)
+            thematic_docs = self._create_thematic_documents(df, now_iso)
             documents.extend(thematic_docs)
 
             logger.info(f"Created {len(documents)} documents from CSV data")
@@ -111,231 +273,107 @@ class LidingoDataIngestion:
 
         return "\n".join(content_parts)
 
-    def _create_url_documents(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+    def _create_url_documents(self, df: pd.DataFrame,
+                              now_iso: str) -> List[Dict[str, Any]]:
         """Create documents for each URL with its content"""
         documents = []
 
-        for idx, row in df.iterrows():
-            if pd.notna(row.get('content')) and pd.notna(row.get('url')):
-                content = str(row['content'])
-                url = str(row['url'])
-                title = str(row.get('title', 'Utan titel'))
+        # Filter with vectorized masks, then iterate a plain ndarray;
+        # the columns are already string dtype from load_and_process_csv
+        # so no per-value str() coercion is needed
+        mask = df['content'].notna() & df['url'].notna() \
+            & (df['content'].str.len() >= 100)  # Skip too short content
 
-                # Skip too short content
-                if len(content) < 100:
-                    continue
+        titles = df['title'].fillna('Utan titel') \
+            if 'title' in df.columns else pd.Series('Utan titel', index=df.index)
 
-                # Format content
-                formatted_content = f"""
+        rows = pd.DataFrame({
+            'content': df['content'],
+            'url': df['url'],
+            'title': titles
+        }).loc[mask].to_numpy()
+
+        for content, url, title in rows:
+            # Format content
+            formatted_content = f"""
 SOURCE: {title}
 URL: {url}
 
 CONTENT:
 {content}
-                """.strip()
-
-                documents.append({
-                    'content': formatted_content,
-                    'metadata': {
-                        'type': 'url_content',
-                        'race': 'lidingo',
-                        'url': url,
-                        'title': title,
-                        'content_length': len(content),
-                        'created_at': datetime.now().isoformat()
-                    },
-                    'id': f"url_{uuid.uuid4().hex[:8]}"
-                })
+            """.strip()
+
+            documents.append({
+                'content': formatted_content,
+                'metadata': {
+                    'type': 'url_content',
+                    'race': 'lidingo',
+                    'url': url,
+                    'title': title,
+                    'content_length': len(content),
+                    'created_at': now_iso
+                },
+                'id': f"url_{token_hex(4)}"
+            })
 
         return documents
 
-    def _create_thematic_documents(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+    def _create_thematic_documents(self, df: pd.DataFrame,
+                                   now_iso: str) -> List[Dict[str, Any]]:
         """Create thematic documents based on content type"""
         documents = []
 
         if 'content_type' in df.columns:
             # Group by content_type
-            for content_type in df['content_type'].dropna().unique():
-                type_df = df[df['content_type'] == content_type]
+            for content_type, type_df in df.groupby('content_type', sort=False):
+                type_df = type_df[type_df['content'].notna()] \
+                    if 'content' in type_df.columns else type_df.iloc[0:0]
 
                 if len(type_df) == 0:
                     continue
 
-                # Combine all content for this type
-                combined_content = []
-                combined_content.append(
-                    f"INFORMATION ABOUT: {content_type.upper()}")
-                combined_content.append("")
-
-                for idx, row in type_df.iterrows():
-                    if pd.notna(row.get('content')):
-                        title = row.get('title', 'Utan titel')
-                        content = str(row['content'])
+                titles = type_df['title'].fillna('Utan titel') \
+                    if 'title' in type_df.columns \
+                    else pd.Series('Utan titel', index=type_df.index)
 
-                        combined_content.append(f"--- {title} ---")
-                        combined_content.append(content)
-                        combined_content.append("")
+                # Combine all content for this type with one join over a
+                # contiguous list instead of three appends per row
+                sections = [
+                    f"--- {title} ---\n{content}"
+                    for title, content in zip(titles.to_numpy(),
+                                              type_df['content'].to_numpy())
+                ]
 
-                if len(combined_content) > 3:  # Only if we have real content
+                if sections:  # Only if we have real content
                     documents.append({
-                        'content': "\n".join(combined_content),
+                        'content': f"INFORMATION ABOUT: {content_type.upper()}\n\n"
+                                   + "\n\n".join(sections) + "\n",
                         'metadata': {
                             'type': 'thematic_content',
                             'race': 'lidingo',
                             'theme': content_type,
                             'source_count': len(type_df),
-                            'created_at': datetime.now().isoformat()
+                            'created_at': now_iso
                         },
-                        'id': f"theme_{content_type}_{uuid.uuid4().hex[:8]}"
+                        'id': f"theme_{content_type}_{token_hex(4)}"
                     })
 
         return documents
 
     def _extract_key_topics(self, text: str) -> List[str]:
         """Extract key topics from text (simple implementation)"""
-        # List of important terms for Lidingöloppet
-        key_terms = [
-            'anmälan', 'startinformation', 'resultat', 'praktisk information',
-            'partners', 'nyheter', 'sportmässa', 'svenska klassiker',
-            'cykling', 'simning', 'löpning', 'skidåkning',
-            'vasaloppet', 'vätternrundan', 'vansbrosimningen',
-            'träning', 'förberedelse', 'utrustning', 'nutrition',
-            'väder', 'bana', 'höjdmeter', 'distans'
-        ]
-
-        text_lower = text.lower()
-        found_topics = []
+        # One compiled-alternation pass over the text instead of one
+        # full substring scan per term
+        found = {m.group(0).lower() for m in _KEY_TERMS_RE.finditer(text)}
 
-        for term in key_terms:
-            if term in text_lower:
-                found_topics.append(term.title())
+        return [term.title() for term in _KEY_TERMS
+                if term in found][:10]  # Max 10 topics, original order
 
-        return found_topics[:10]  # Max 10 topics
-
-    def create_training_guidelines(self) -> List[Dict[str, Any]]:
+    def create_training_guidelines(self, now_iso: str) -> List[Dict[str, Any]]:
         """Create training guides based on Lidingöloppet"""
         training_docs = []
 
-        # Basic training guides
-        guidelines = [
-            {
-                'title': 'Grundträning för Lidingöloppet',
-                'content': """
-GRUNDTRÄNING FÖR LIDINGÖLOPPET (30KM TERRÄNGLOPP)
-
-TRÄNINGSPERIOD: 12-20 veckor före loppet
-
-GRUNDLÄGGANDE PRINCIPER:
-- Bygg upp gradvis volym och intensitet
-- 80% av träningen ska vara i låg intensitet
-- 20% kan vara medium till hög intensitet
-- Vila är lika viktigt som träning
-
-VECKOSTRUKTUR:
-- 3-4 träningspass per vecka för nybörjare
-- 4-6 träningspass per vecka för erfarna
-- Minst en vilodag mellan hårda pass
-
-TRÄNINGSTYPER:
-1. Grundträning (lätt jogging): 60-80% av träningen
-2. Tempoträning (medel intensitet): 10-15% av träningen  
-3. Intervallträning (hög intensitet): 5-10% av träningen
-4. Lågpass (mycket lätt): 10-15% av träningen
-
-SPECIFIKT FÖR LIDINGÖLOPPET:
-- Träna regelbundet i terräng
-- Öva backspring och backgång
-- Träna balans och koordination på teknisk mark
-- Bygg upp till 2-2.5 timmar längsta pass
-                """,
-                'topics': ['grundträning', 'periodisering', 'träningstyper']
-            },
-            {
-                'title': 'Specifik träning för Lidingöloppets terräng',
-                'content': """
-TERRÄNGSPECIFIK TRÄNING FÖR LIDINGÖLOPPET
-
-LIDINGÖLOPPETS UTMANINGAR:
-- 30 km distans med ca 400 höjdmeter
-- Tekniska klipppartier kilometer 8-12
-- Lång uppförsbacke vid kilometer 15
-- Halt underlag vid regn
-- Tät skog med rotiga stigar
-
-SPECIFIKA TRÄNINGSOMRÅDEN:
-
-1. BACKTRÄNING:
-- Korta, branta backar för kraft (30-60 sekunder)
-- Långa, måttliga backar för uthållighet (3-8 minuter)
-- Träna både uppför och nedför
-- Fokus på teknik och effektivitet
-
-2. TEKNISK TRÄNING:
-- Träna på rötter, stenar och ojämn mark
-- Balansträning på instabil yta
-- Koordinationsövningar
-- Träna med olika underlag (torrt/blött)
-
-3. MENTALA FÖRBEREDELSER:
-- Långa pass i tuff terräng
-- Träna i olika väderförhållanden  
-- Öva nutrition och vätskeintag under löpning
-- Visualisering av loppet
-
-REKOMMENDERADE TRÄNINGSPLATSER:
-- Teknisk skogsterräng
-- Klippiga områden (försiktigt!)
-- Varierad terräng med både backar och flacka partier
-                """,
-                'topics': ['terrängträning', 'backträning', 'teknik', 'mental träning']
-            },
-            {
-                'title': 'Tävlingsförberedelse och strategi',
-                'content': """
-TÄVLINGSFÖRBEREDELSE FÖR LIDINGÖLOPPET
-
-3 VECKOR FÖRE LOPPET:
-- Minska träningsvolymen gradvis
-- Behåll intensiteten i små doser
-- Fokus på återhämtning och hälsa
-- Testa all utrustning
-
-VECKAN FÖRE LOPPET:
-- Lätta joggingpass, max 45-60 minuter
-- 2-3 korta tempointervaller (håll kroppen vaken)
-- Extra sömn och bra kost
-- Undvik nya aktiviteter
-
-LOPPSTRATEGI:
-
-START (0-5 km):
-- Starta försiktigt, låt kroppen värma upp
-- Följ inte med i för högt tempo från start
-- Spara energi för senare delen
-
-MITTENDELEN (5-20 km):
-- Hitta din rytm och håll den
-- Var extra försiktig i tekniska partier
-- Tänk på vätskeintag var 5:e km
-- Använd energi vid uppmuntringsposter
-
-SLUTDELEN (20-30 km):
-- Här avgörs loppet - nu får du använda sparad energi
-- Fokus på teknik även när du blir trött
-- Positiv inställning och kämparglöd
-- Tänk på målgång och känslan av att vara klar!
-
-UTRUSTNING:
-- Terrängskor med bra grepp
-- Fungerande kläder (inga nya på loppdag!)
-- Energi för 2.5-3 timmar
-- Huvudbonad och handdukar vid växlingar
-                """,
-                'topics': ['tävlingsförberedelse', 'loppstrategi', 'utrustning', 'mental förberedelse']
-            }
-        ]
-
-        for guide in guidelines:
+        for guide in _TRAINING_GUIDELINES:
             training_docs.append({
                 'content': guide['content'],
                 'metadata': {
@@ -343,54 +381,60 @@ UTRUSTNING:
                     'race': 'lidingo',
                     'title': guide['title'],
                     # FIXED: Convert list to string
-                    'topics': ', '.join(guide['topics']),
-                    'created_at': datetime.now().isoformat()
+                    'topics': guide['topics_str'],
+                    'created_at': now_iso
                 },
-                'id': f"training_{uuid.uuid4().hex[:8]}"
+                'id': f"training_{token_hex(4)}"
             })
 
         return training_docs
 
+    def _add_in_batches(self, collection_name: str,
+                        docs: List[Dict[str, Any]]):
+        """Add documents to a collection in streaming batches.
+
+        ingest_all_data runs in a worker thread (startup/background
+        task), so this deliberately takes the store's sync path: the
+        async path's pooled AsyncClient is bound to the server's event
+        loop, and driving it under a thread-local asyncio.run loop
+        would leave dead connections behind for later queries.
+        """
+        self.vector_store.add_documents(
+            collection_name=collection_name,
+            documents=[doc['content'] for doc in docs],
+            metadatas=[doc['metadata'] for doc in docs],
+            ids=[doc['id'] for doc in docs]
+        )
+
     def ingest_all_data(self) -> Dict[str, Any]:
         """Main method for importing all data"""
         try:
             logger.info("Starting data ingestion process...")
 
+            # One shared timestamp for the whole run; per-document
+            # datetime.now() calls are a syscall each and the documents
+            # belong to the same ingestion anyway
+            now_iso = datetime.now().isoformat()
+
             # 1. Load CSV data
             df = self.load_and_process_csv()
 
             # 2. Create race documents from CSV
-            race_documents = self.create_race_documents(df)
+            race_documents = self.create_race_documents(df, now_iso)
 
             # 3. Create training guides
-            training_documents = self.create_training_guidelines()
+            training_documents = self.create_training_guidelines(now_iso)
 
             # 4. Import race data to ChromaDB
             if race_documents:
-                documents = [doc['content'] for doc in race_documents]
-                metadatas = [doc['metadata'] for doc in race_documents]
-                ids = [doc['id'] for doc in race_documents]
-
-                self.vector_store.add_documents(
-                    collection_name=self.vector_store.RACE_DATA_COLLECTION,
-                    documents=documents,
-                    metadatas=metadatas,
-                    ids=ids
-                )
+                self._add_in_batches(
+                    self.vector_store.RACE_DATA_COLLECTION, race_documents)
                 logger.info(f"Imported {len(race_documents)} race documents")
 
             # 5. Import training documents
             if training_documents:
-                documents = [doc['content'] for doc in training_documents]
-                metadatas = [doc['metadata'] for doc in training_documents]
-                ids = [doc['id'] for doc in training_documents]
-
-                self.vector_store.add_documents(
-                    collection_name=self.vector_store.TRAINING_COLLECTION,
-                    documents=documents,
-                    metadatas=metadatas,
-                    ids=ids
-                )
+                self._add_in_batches(
+                    self.vector_store.TRAINING_COLLECTION, training_documents)
                 logger.info(
                     f"Imported {len(training_documents)} training documents")
 
@@ -401,7 +445,7 @@ UTRUSTNING:
                 'race_documents_created': len(race_documents),
                 'training_documents_created': len(training_documents),
                 'total_documents': len(race_documents) + len(training_documents),
-                'timestamp': datetime.now().isoformat()
+                'timestamp': now_iso
             }
 
             logger.info(f"Data ingestion completed successfully: {summary}")
@@ -1,15 +1,45 @@
-from datetime import datetime, timedelta
-from typing import Dict, Any, List
-import uuid
+from datetime import date, datetime
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Any
+import io
 
+# RFC 5545 requires CRLF line endings
+_CRLF = "\r\n"
 
-def generate_ics_file(plan_data: Dict[str, Any], plan_id: str, race_name: str, race_date) -> str:
+
+def _as_date(value) -> date:
+    """Normalize an ISO string (plan data loaded from the DB) or
+    date/datetime to a date"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _normalize_session_dates(plan_data: Dict[str, Any]):
+    """Parse session date strings in place, once per export.
+
+    The event helper can then assume date objects instead of paying an
+    isinstance check and parse per session.
     """
-    Generates ICS calendar content from training plan data
+    for week in plan_data.get("weeks", []):
+        for session in week.get("sessions", []):
+            session_date = session.get("date")
+            if isinstance(session_date, str):
+                session["date"] = datetime.fromisoformat(session_date).date()
+
+
+async def iter_ics_file(plan_data: Dict[str, Any], plan_id: str, race_name: str, race_date) -> AsyncIterator[bytes]:
+    """
+    Yields ICS calendar content as encoded chunks, one per event.
+
+    Streaming counterpart to generate_ics_file: the full calendar is never
+    materialized in memory and transmission starts at the first chunk.
     """
 
     # ICS header
-    lines = [
+    header = [
         "BEGIN:VCALENDAR",
         "VERSION:2.0",
         "PRODID:-//RaceBuddy//Training Plan//EN",
@@ -18,154 +48,195 @@ def generate_ics_file(plan_data: Dict[str, Any], plan_id: str, race_name: str, r
         f"X-WR-CALNAME:Träningsplan - {race_name}",
         f"X-WR-CALDESC:Personlig träningsplan för {race_name}"
     ]
+    yield (_CRLF.join(header) + _CRLF).encode("utf-8")
 
-    # Add training sessions
-    weeks = plan_data.get("weeks", [])
+    _normalize_session_dates(plan_data)
+
+    # One DTSTAMP shared by every event in the export
+    created_ics = datetime.now().strftime("%Y%m%dT%H%M%SZ")
 
-    for week in weeks:
-        sessions = week.get("sessions", [])
+    # Training sessions, one VEVENT chunk per session
+    index = 0
+    for week in plan_data.get("weeks", []):
+        for session in week.get("sessions", []):
+            event = _create_training_event(
+                session, plan_id, created_ics, index)
+            yield (event + _CRLF).encode("utf-8")
+            index += 1
 
-        for session in sessions:
-            event_lines = _create_training_event(session, plan_id)
-            lines.extend(event_lines)
+    # Race day event
+    race_event = _create_race_event(
+        race_name, race_date, plan_id, created_ics)
+    yield (race_event + _CRLF).encode("utf-8")
+
+    # ICS footer
+    yield b"END:VCALENDAR"
+
+
+def generate_ics_file(plan_data: Dict[str, Any], plan_id: str, race_name: str, race_date) -> str:
+    """
+    Generates ICS calendar content from training plan data
+    """
+
+    # Write into one growing buffer; getvalue() is a single copy out,
+    # and join's extra length-computation pass over all parts goes away
+    buf = io.StringIO()
+
+    # ICS header
+    buf.write(
+        "BEGIN:VCALENDAR" + _CRLF +
+        "VERSION:2.0" + _CRLF +
+        "PRODID:-//RaceBuddy//Training Plan//EN" + _CRLF +
+        "CALSCALE:GREGORIAN" + _CRLF +
+        "METHOD:PUBLISH" + _CRLF +
+        f"X-WR-CALNAME:Träningsplan - {race_name}" + _CRLF +
+        f"X-WR-CALDESC:Personlig träningsplan för {race_name}" + _CRLF
+    )
+
+    _normalize_session_dates(plan_data)
+
+    # One DTSTAMP shared by every event in the export; strftime per
+    # event would produce the identical string N times
+    created_ics = datetime.now().strftime("%Y%m%dT%H%M%SZ")
+
+    # Add training sessions
+    index = 0
+    for week in plan_data.get("weeks", []):
+        for session in week.get("sessions", []):
+            buf.write(_create_training_event(
+                session, plan_id, created_ics, index))
+            buf.write(_CRLF)
+            index += 1
 
     # Add race date
-    race_event_lines = _create_race_event(race_name, race_date, plan_id)
-    lines.extend(race_event_lines)
+    buf.write(_create_race_event(race_name, race_date, plan_id, created_ics))
+    buf.write(_CRLF)
 
     # ICS footer
-    lines.append("END:VCALENDAR")
+    buf.write("END:VCALENDAR")
 
-    return "\n".join(lines)
+    return buf.getvalue()
 
 
-def _create_training_event(session: Dict[str, Any], plan_id: str) -> List[str]:
+def _create_training_event(session: Dict[str, Any], plan_id: str,
+                           created_ics: str, index: int) -> str:
     """Creates ICS event for a training session"""
 
-    # Get session data
-    session_date = session.get("date")
-    session_type = session.get("type", "Träning")
-    description = session.get("description", "")
-    distance = session.get("distance_km")
-    pace = session.get("pace")
-    intensity = session.get("intensity", "")
-
-    # Convert date
-    if isinstance(session_date, str):
-        event_date = datetime.fromisoformat(session_date).date()
-    else:
-        event_date = session_date
-
-    # Standard training time: 06:00-07:00
-    start_time = datetime.combine(
-        event_date, datetime.min.time().replace(hour=6))
-    end_time = start_time + timedelta(hours=1)
-
-    # Format dates for ICS
-    start_ics = start_time.strftime("%Y%m%dT%H%M%S")
-    end_ics = end_time.strftime("%Y%m%dT%H%M%S")
-    created_ics = datetime.now().strftime("%Y%m%dT%H%M%SZ")
+    # Get session data, one dict lookup per field
+    session_get = session.get
+    event_date = session_get("date")  # Normalized by the caller
+    session_type = session_get("type")
+    description = session_get("description")
+    distance = session_get("distance_km")
+    pace = session_get("pace")
+    intensity = session_get("intensity")
+    notes = session_get("notes")
+
+    # Standard training time: 06:00-07:00. Direct f-string formatting
+    # skips strftime's locale machinery for fixed wall-clock times
+    day_ics = f"{event_date.year:04d}{event_date.month:02d}{event_date.day:02d}"
+    start_ics = f"{day_ics}T060000"
+    end_ics = f"{day_ics}T070000"
 
     # Build title - use session description as main title
-    title = session.get("description", session.get("type", "Träning"))
+    title = description or session_type or "Träning"
 
     # Build description - use notes (focus) as primary description
     desc_parts = []
-    if session.get("notes"):  # This is "focus" from the AI plan
-        desc_parts.append(f"Fokus: {session['notes']}")
+    if notes:  # This is "focus" from the AI plan
+        desc_parts.append(f"Fokus: {notes}")
 
-    if session.get("type"):
-        desc_parts.append(f"Typ: {session['type']}")
+    if session_type:
+        desc_parts.append(f"Typ: {session_type}")
 
     if distance and pace:
         estimated_time = _estimate_session_time(distance, pace)
         if estimated_time:
             desc_parts.append(f"Beräknad tid: {estimated_time}")
 
-    if session.get("intensity"):
-        desc_parts.append(f"Intensitet: {session['intensity']}")
+    if intensity:
+        desc_parts.append(f"Intensitet: {intensity}")
 
     desc_parts.append("\\n\\nGenererad av RaceBuddy")
     full_description = "\\n".join(desc_parts)
 
-    # Generate unique UID
-    event_uid = f"{plan_id}-{event_date.isoformat()}-{uuid.uuid4().hex[:8]}@racebuddy.com"
-
-    return [
-        "BEGIN:VEVENT",
-        f"UID:{event_uid}",
-        f"DTSTAMP:{created_ics}",
-        f"DTSTART:{start_ics}",
-        f"DTEND:{end_ics}",
-        f"SUMMARY:{title}",
-        f"DESCRIPTION:{full_description}",
-        "CATEGORIES:Träning",
-        "STATUS:CONFIRMED",
-        "TRANSP:OPAQUE",
-        # Reminder 30 minutes before
-        "BEGIN:VALARM",
-        "ACTION:DISPLAY",
-        "DESCRIPTION:Dags för träning!",
-        "TRIGGER:-PT30M",
-        "END:VALARM",
+    # Deterministic UID: unique within the plan and stable across
+    # re-exports, so calendar clients merge instead of duplicating
+    event_uid = f"{plan_id}-{event_date.isoformat()}-{index:04d}@racebuddy.com"
+
+    # One block per event: a single medium string beats 17 small ones
+    # plus the list bookkeeping (reminder 30 minutes before included)
+    return (
+        "BEGIN:VEVENT\r\n"
+        f"UID:{event_uid}\r\n"
+        f"DTSTAMP:{created_ics}\r\n"
+        f"DTSTART:{start_ics}\r\n"
+        f"DTEND:{end_ics}\r\n"
+        f"SUMMARY:{title}\r\n"
+        f"DESCRIPTION:{full_description}\r\n"
+        "CATEGORIES:Träning\r\n"
+        "STATUS:CONFIRMED\r\n"
+        "TRANSP:OPAQUE\r\n"
+        "BEGIN:VALARM\r\n"
+        "ACTION:DISPLAY\r\n"
+        "DESCRIPTION:Dags för träning!\r\n"
+        "TRIGGER:-PT30M\r\n"
+        "END:VALARM\r\n"
         "END:VEVENT"
-    ]
+    )
 
 
-def _create_race_event(race_name: str, race_date, plan_id: str) -> List[str]:
+def _create_race_event(race_name: str, race_date, plan_id: str,
+                       created_ics: str) -> str:
     """Creates ICS event for race day"""
 
     # Convert date
-    if isinstance(race_date, str):
-        event_date = datetime.fromisoformat(race_date).date()
-    else:
-        event_date = race_date
-
-    # Race start usually in the morning
-    start_time = datetime.combine(
-        event_date, datetime.min.time().replace(hour=9))
-    end_time = start_time + timedelta(hours=4)  # Generous time to finish
-
-    # Format dates for ICS
-    start_ics = start_time.strftime("%Y%m%dT%H%M%S")
-    end_ics = end_time.strftime("%Y%m%dT%H%M%S")
-    created_ics = datetime.now().strftime("%Y%m%dT%H%M%SZ")
+    event_date = _as_date(race_date)
+
+    # Race start usually in the morning, with generous time to finish
+    day_ics = f"{event_date.year:04d}{event_date.month:02d}{event_date.day:02d}"
+    start_ics = f"{day_ics}T090000"
+    end_ics = f"{day_ics}T130000"
 
     # Generate unique UID
     event_uid = f"{plan_id}-race-{event_date.isoformat()}@racebuddy.com"
 
     description = f"TÄVLINGSDAG! {race_name}\\n\\nDu har tränat hårt för denna dag. Lycka till!\\n\\nTips:\\n- Ät bra frukost 2-3 timmar före start\\n- Värm upp ordentligt\\n- Kör enligt plan\\n\\nGenererad av RaceBuddy"
 
-    return [
-        "BEGIN:VEVENT",
-        f"UID:{event_uid}",
-        f"DTSTAMP:{created_ics}",
-        f"DTSTART:{start_ics}",
-        f"DTEND:{end_ics}",
-        f"SUMMARY:🏃‍♂️🏆 {race_name} - TÄVLINGSDAG!",
-        f"DESCRIPTION:{description}",
-        "CATEGORIES:Tävling",
-        "STATUS:CONFIRMED",
-        "TRANSP:OPAQUE",
-        "PRIORITY:9",
-        # Reminder the day before
-        "BEGIN:VALARM",
-        "ACTION:DISPLAY",
-        "DESCRIPTION:Imorgon är det tävling! Förbered utrustning och mental förberedelse.",
-        "TRIGGER:-P1D",
-        "END:VALARM",
-        # Reminder 2 hours before
-        "BEGIN:VALARM",
-        "ACTION:DISPLAY",
-        "DESCRIPTION:Tävlingsdag! Ät frukost och börja förbereda dig.",
-        "TRIGGER:-PT2H",
-        "END:VALARM",
+    # Reminders: the day before and 2 hours before
+    return (
+        "BEGIN:VEVENT\r\n"
+        f"UID:{event_uid}\r\n"
+        f"DTSTAMP:{created_ics}\r\n"
+        f"DTSTART:{start_ics}\r\n"
+        f"DTEND:{end_ics}\r\n"
+        f"SUMMARY:🏃‍♂️🏆 {race_name} - TÄVLINGSDAG!\r\n"
+        f"DESCRIPTION:{description}\r\n"
+        "CATEGORIES:Tävling\r\n"
+        "STATUS:CONFIRMED\r\n"
+        "TRANSP:OPAQUE\r\n"
+        "PRIORITY:9\r\n"
+        "BEGIN:VALARM\r\n"
+        "ACTION:DISPLAY\r\n"
+        "DESCRIPTION:Imorgon är det tävling! Förbered utrustning och mental förberedelse.\r\n"
+        "TRIGGER:-P1D\r\n"
+        "END:VALARM\r\n"
+        "BEGIN:VALARM\r\n"
+        "ACTION:DISPLAY\r\n"
+        "DESCRIPTION:Tävlingsdag! Ät frukost och börja förbereda dig.\r\n"
+        "TRIGGER:-PT2H\r\n"
+        "END:VALARM\r\n"
         "END:VEVENT"
-    ]
+    )
 
 
+@lru_cache(maxsize=256)
 def _estimate_session_time(distance_km: float, pace: str) -> str:
-    """Calculates estimated session time based on distance and pace"""
+    """Calculates estimated session time based on distance and pace
+
+    Plans repeat the same (distance, pace) pairs across weeks, so the
+    parse + arithmetic is memoized.
+    """
     try:
         # Parse pace (format: "5:30")
         pace_parts = pace.split(":")
@@ -143,3 +143,12 @@ class TrainingPlan(BaseModel):
     weeks: List[Dict]
     total_weeks: int
     total_distance_km: int = Field(..., ge=0)
+
+
+# Build the schemas and prime the serializers for the hot request
+# models at import time, so the first request per worker doesn't pay
+# the pydantic schema-construction cost
+for _model in (TrainingPlanRequest, TrainingSession, WeekPlan,
+               TrainingPlanResponse, MessageResponse):
+    _model.model_rebuild(force=True)
+    _model.__pydantic_serializer__
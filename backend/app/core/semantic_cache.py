@@ -0,0 +1,170 @@
+"""
+Semantic cache for chat responses.
+
+Near-identical questions ("Hur lång är Lidingöloppet?" and friends) are
+asked over and over; embedding + RAG + LLM for each repeat is wasted
+cost. The cache keeps the embeddings of recently answered questions and
+serves the stored response when a new query is close enough in cosine
+similarity.
+"""
+
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from core.vector_store import get_vector_store
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vector) -> np.ndarray:
+    embedding = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(embedding)
+    if norm > 0:
+        embedding = embedding / norm
+    return embedding
+
+
+class SemanticCache:
+    """In-process semantic cache keyed by query embedding"""
+
+    def __init__(self, threshold: float = 0.97, maxsize: int = 256,
+                 ttl_seconds: int = 3600):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+
+        # Normalized embeddings (n, d) aligned with self._entries
+        self._embeddings: Optional[np.ndarray] = None
+        self._entries: List[Dict[str, Any]] = []
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a query with the same model as the RAG pipeline"""
+        return _normalize(get_vector_store().embeddings.embed_query(text))
+
+    async def aembed(self, text: str) -> np.ndarray:
+        """Async twin of embed. The embedding is an OpenAI HTTP
+        round-trip, so request handlers must await this rather than
+        block the event loop on embed()."""
+        return _normalize(
+            await get_vector_store().embeddings.aembed_query(text))
+
+    def lookup(self, embedding: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Return the cached entry most similar to the embedding, if any
+        entry is fresh and above the similarity threshold"""
+        self._evict_expired()
+
+        if self._embeddings is None or len(self._entries) == 0:
+            return None
+
+        similarities = self._embeddings @ embedding
+        best_index = int(np.argmax(similarities))
+
+        if similarities[best_index] >= self.threshold:
+            logger.info(
+                "Semantic cache hit (similarity: %.3f)", similarities[best_index])
+            return self._entries[best_index]
+
+        return None
+
+    def store(self, embedding: np.ndarray, entry: Dict[str, Any]):
+        """Store a response under its query embedding"""
+        entry = {**entry, "cached_at": time.monotonic()}
+
+        if len(self._entries) >= self.maxsize:
+            # Drop the oldest entry
+            self._entries.pop(0)
+            self._embeddings = self._embeddings[1:]
+
+        self._entries.append(entry)
+        row = embedding.reshape(1, -1)
+        if self._embeddings is None:
+            self._embeddings = row
+        else:
+            self._embeddings = np.vstack([self._embeddings, row])
+
+    def clear(self):
+        """Drop all cached entries"""
+        self._embeddings = None
+        self._entries = []
+
+    def _evict_expired(self):
+        if not self._entries:
+            return
+
+        cutoff = time.monotonic() - self.ttl_seconds
+        keep = [i for i, e in enumerate(self._entries)
+                if e["cached_at"] >= cutoff]
+
+        if len(keep) != len(self._entries):
+            self._entries = [self._entries[i] for i in keep]
+            self._embeddings = self._embeddings[keep] if keep else None
+
+
+class QuickQuestionCache:
+    """FAQ cache seeded from the predefined quick questions.
+
+    The frontend shows eight fixed questions, so a large share of /ask
+    traffic is one of them (or a light paraphrase). Their embeddings are
+    computed once; a request matching one with high similarity reuses
+    the answer generated the first time that question was asked, with no
+    TTL since the underlying knowledge base only changes on re-ingest.
+    """
+
+    def __init__(self, questions: List[str], threshold: float = 0.95):
+        self.questions = list(questions)
+        self.threshold = threshold
+
+        # Embedded at startup via awarm(); importing the module never
+        # calls the embedding API
+        self._matrix: Optional[np.ndarray] = None
+        self._answers: Dict[int, Dict[str, Any]] = {}
+
+    def _build_matrix(self, vectors) -> None:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self._matrix = matrix / np.where(norms > 0, norms, 1.0)
+
+    async def awarm(self) -> None:
+        """Embed the quick questions once, off the request path"""
+        if self._matrix is None:
+            self._build_matrix(await get_vector_store()
+                               .embeddings.aembed_documents(self.questions))
+
+    async def amatch(self, embedding: np.ndarray) -> Optional[int]:
+        """Async match; warms the question matrix if startup didn't"""
+        await self.awarm()
+        return self._match(embedding)
+
+    def match(self, embedding: np.ndarray) -> Optional[int]:
+        """Return the index of the quick question closest to the
+        embedding, or None if nothing clears the threshold"""
+        if self._matrix is None:
+            self._build_matrix(
+                get_vector_store().embeddings.embed_documents(self.questions))
+        return self._match(embedding)
+
+    def _match(self, embedding: np.ndarray) -> Optional[int]:
+        similarities = self._matrix @ embedding
+        best_index = int(np.argmax(similarities))
+
+        if similarities[best_index] >= self.threshold:
+            logger.info("Quick-question match: %r (similarity: %.3f)",
+                        self.questions[best_index], similarities[best_index])
+            return best_index
+
+        return None
+
+    def get(self, index: int) -> Optional[Dict[str, Any]]:
+        """Return the stored answer for a quick question, if any"""
+        return self._answers.get(index)
+
+    def store(self, index: int, entry: Dict[str, Any]):
+        """Remember the generated answer for a quick question"""
+        self._answers[index] = entry
+
+
+# Singleton instance shared by the chat endpoints
+chat_response_cache = SemanticCache()
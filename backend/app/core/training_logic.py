@@ -1,58 +1,336 @@
+from collections import OrderedDict, namedtuple
+from dataclasses import dataclass
+from functools import lru_cache
 from datetime import date, timedelta
-from typing import List, Dict, Any
+from types import MappingProxyType
+from typing import List, Dict, Any, Optional, Tuple
 from core.schemas import TrainingPlanRequest, WeekPlan, TrainingSession
-import math
+from core._training_kernels import week_multipliers
+import json
 import logging
+import re
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
-# Original training generator (fallback)
+# Pace patterns used when parsing AI responses, compiled once
+_PACE_AT_RE = re.compile(r'@\s*(\d+:\d+)/km')
+_PACE_RANGE_RE = re.compile(r'(\d+:\d+)-(\d+:\d+)/km')
 
+_JSON_DECODER = json.JSONDecoder()
 
-class TrainingPlanGenerator:
-    """Generates training plans based on user data"""
 
-    def __init__(self):
-        # Basic training types
-        self.session_types = {
-            "easy_run": {
-                "name": "Lugnt löppass",
-                "description": "Lätt och behagligt tempo, bra för återhämtning",
-                "intensity": "low"
-            },
-            "tempo_run": {
-                "name": "Tempopass",
-                "description": "Medelhårt tempo, ungefär som tävlingstempo",
-                "intensity": "medium"
-            },
-            "interval_training": {
-                "name": "Intervallträning",
-                "description": "Hög intensitet med vila mellan intervaller",
-                "intensity": "high"
-            },
-            "long_run": {
-                "name": "Långpass",
-                "description": "Långt pass för att bygga uthållighet",
-                "intensity": "low-medium"
-            },
-            "hill_training": {
-                "name": "Backträning",
-                "description": "Träning i backar för att bygga styrka",
-                "intensity": "medium-high"
-            },
-            "recovery_run": {
-                "name": "Återhämtningspass",
-                "description": "Mycket lätt jogging för aktiv återhämtning",
-                "intensity": "very_low"
-            }
+def _extract_json(content: str) -> Optional[Dict[str, Any]]:
+    """Return the first valid JSON object in content, or None.
+
+    raw_decode parses forward from each candidate brace, so multi-KB AI
+    responses avoid the backtracking and full-span match of the old
+    greedy regex search.
+    """
+    i = content.find('{')
+    while i != -1:
+        try:
+            obj, _ = _JSON_DECODER.raw_decode(content, i)
+            return obj
+        except json.JSONDecodeError:
+            i = content.find('{', i + 1)
+    return None
+
+# Weekly structures per (fitness level, training days) are static, so
+# they live here as one shared table instead of being rebuilt as nested
+# dict literals on every generate_plan call
+_WEEKLY_STRUCTURE_TABLE: Dict[Tuple[str, int], Tuple[str, ...]] = {
+    (level, days): structure
+    for level, per_days in {
+        "beginner": {
+            3: ("easy_run", "easy_run", "long_run"),
+            4: ("easy_run", "tempo_run", "easy_run", "long_run"),
+            5: ("easy_run", "tempo_run", "easy_run", "recovery_run", "long_run"),
+            6: ("easy_run", "tempo_run", "easy_run", "hill_training", "recovery_run", "long_run"),
+            7: ("easy_run", "tempo_run", "easy_run", "interval_training", "easy_run", "recovery_run", "long_run")
+        },
+        "intermediate": {
+            3: ("tempo_run", "interval_training", "long_run"),
+            4: ("easy_run", "tempo_run", "interval_training", "long_run"),
+            5: ("easy_run", "tempo_run", "interval_training", "hill_training", "long_run"),
+            6: ("easy_run", "tempo_run", "interval_training", "hill_training", "recovery_run", "long_run"),
+            7: ("easy_run", "tempo_run", "easy_run", "interval_training", "hill_training", "recovery_run", "long_run")
+        },
+        "advanced": {
+            4: ("tempo_run", "interval_training", "hill_training", "long_run"),
+            5: ("easy_run", "tempo_run", "interval_training", "hill_training", "long_run"),
+            6: ("easy_run", "tempo_run", "interval_training", "hill_training", "tempo_run", "long_run"),
+            7: ("easy_run", "tempo_run", "easy_run", "interval_training", "hill_training", "tempo_run", "long_run")
         }
+    }.items()
+    for days, structure in per_days.items()
+}
+
+# Periodization focuses, shared read-only so every week in every plan
+# references the same four dicts
+_FOCUS_TAPER = MappingProxyType({
+    "name": "Avtrappning",
+    "description": "Minska volymen och vila inför tävling"
+})
+_WEEK_FOCUS_TABLE = (
+    (0.3, MappingProxyType({
+        "name": "Basbyggnad",
+        "description": "Bygg upp grundkondition och löpvolym"
+    })),
+    (0.7, MappingProxyType({
+        "name": "Styrka och fart",
+        "description": "Utveckla löpkraft och hastighet"
+    })),
+    (0.9, MappingProxyType({
+        "name": "Tävlingsförberedelse",
+        "description": "Träna i tävlingstempo och finslipa formen"
+    })),
+)
+
+@lru_cache(maxsize=1024)
+def _training_weeks(start_date: date, race_date: date) -> int:
+    """Number of training weeks, clamped to 4-20"""
+    return max(4, min(20, (race_date - start_date).days // 7))
+
+
+@lru_cache(maxsize=256)
+def _base_distance(fitness_level: str, target_time: str) -> float:
+    """Base weekly volume from fitness level and target level.
+
+    Pure with a tiny key space (3 levels x 3 speed categories), so the
+    target-time parse only runs once per distinct input.
+    """
+    time_parts = target_time.split(':')
+    target_minutes = int(time_parts[0]) * 60 + int(time_parts[1])
+
+    base_distances = {
+        "beginner": {"fast": 35, "medium": 30, "slow": 25},
+        "intermediate": {"fast": 50, "medium": 45, "slow": 40},
+        "advanced": {"fast": 70, "medium": 60, "slow": 55}
+    }
+
+    # Categorize target level (for 30km Lidingöloppet)
+    if target_minutes < 150:  # Under 2:30
+        speed_category = "fast"
+    elif target_minutes < 210:  # 2:30-3:30
+        speed_category = "medium"
+    else:  # Over 3:30
+        speed_category = "slow"
+
+    return base_distances[fitness_level][speed_category]
+
+
+# One frozen spec per session type consolidates what used to live in
+# four separate dicts (names/intensities in __init__, distribution,
+# base paces and description f-strings rebuilt inside their methods).
+# Each session now costs a single lookup plus attribute reads.
+SessionSpec = namedtuple(
+    "SessionSpec",
+    "name description intensity distribution base_pace min_km max_km desc_template")
+
+_SESSION_SPEC: Dict[str, SessionSpec] = {
+    "easy_run": SessionSpec(
+        "Lugnt löppass",
+        "Lätt och behagligt tempo, bra för återhämtning",
+        "low", 0.15, "6:00", 4, 15,
+        "Löp {d} km i lugnt tempo. Fokusera på teknik och andning."),
+    "tempo_run": SessionSpec(
+        "Tempopass",
+        "Medelhårt tempo, ungefär som tävlingstempo",
+        "medium", 0.20, "5:20", 4, 15,
+        "Löp {d} km i medelhårt tempo, ungefär som din måltid i loppet."),
+    "interval_training": SessionSpec(
+        "Intervallträning",
+        "Hög intensitet med vila mellan intervaller",
+        "high", 0.15, "4:50", 4, 15,
+        "Intervallträning totalt {d} km. Växla mellan hög intensitet och vila."),
+    "long_run": SessionSpec(
+        "Långpass",
+        "Långt pass för att bygga uthållighet",
+        "low-medium", 0.35, "5:50", 8, 25,
+        "Långpass {d} km. Bygg uthållighet med stadigt tempo."),
+    "hill_training": SessionSpec(
+        "Backträning",
+        "Träning i backar för att bygga styrka",
+        "medium-high", 0.15, "5:40", 4, 15,
+        "Backträning {d} km. Sök upp backar och träna löpkraft."),
+    "recovery_run": SessionSpec(
+        "Återhämtningspass",
+        "Mycket lätt jogging för aktiv återhämtning",
+        "very_low", 0.10, "6:30", 3, 8,
+        "Mycket lätt jogging {d} km. Hjälper kroppen att återhämta sig."),
+}
+
+# Intensity per AI-reported session type, shared across calls
+_INTENSITY_MAP = {
+    "Grundträning": "low",
+    "Längdpass": "low-medium",
+    "Tempoträning": "medium",
+    "Intervall": "high",
+    "Backträning": "medium-high",
+    "Återhämtning": "very_low"
+}
+
+# Session-day layout is fixed (Monday, Wednesday, Friday, Saturday,
+# Tuesday, Thursday, Sunday; Monday = 0), so the sorted offset tuple per
+# session count and the seven possible timedeltas are precomputed once
+_PREFERRED_DAYS = (0, 2, 4, 5, 1, 3, 6)
+_DAY_DELTAS = tuple(timedelta(days=d) for d in range(7))
+_WEEK_DELTA = timedelta(days=7)
+_SORTED_OFFSETS = tuple(
+    tuple(sorted(_PREFERRED_DAYS[i % 7] for i in range(n)))
+    for n in range(8))
+
+
+def _get_training_days(week_start: date, num_sessions: int) -> List[date]:
+    """Distributes training sessions across the week"""
+    if num_sessions <= 7:
+        offsets = _SORTED_OFFSETS[num_sessions]
+    else:
+        # More sessions than days: repeat the cycle like before
+        offsets = sorted(_PREFERRED_DAYS[i % 7] for i in range(num_sessions))
+    return [week_start + _DAY_DELTAS[d] for d in offsets]
+
+
+def _week_distances(total_weeks: int, base_distance: float) -> np.ndarray:
+    """Periodized weekly volumes for a whole plan in one kernel call.
+
+    Same curve as before (base build 0.7-1.0, sine-shaped peak around
+    1.15, race-specific 1.0, taper 0.6); the multiplier kernel lives in
+    core._training_kernels and is JIT-compiled when numba is installed.
+    """
+    return np.rint(
+        base_distance * week_multipliers(total_weeks)).astype(np.int32)
+
+
+# Generated-plan cache. Plans are fully determined by the semantic
+# tuple below except for the calendar anchor, so a hit only needs its
+# dates shifted to the new start date instead of regenerating weeks.
+# Templates are stored as slotted dataclass drafts rather than pydantic
+# models: roughly a quarter of the resident bytes per session, which
+# matters with up to _PLAN_CACHE_MAXSIZE full plans held.
+_PLAN_CACHE_MAXSIZE = 1024
+_plan_cache: "OrderedDict[tuple, tuple[date, Dict[str, Any]]]" = OrderedDict()
+
+
+@dataclass(slots=True)
+class _SessionDraft:
+    date: date
+    type: str
+    description: str
+    distance_km: Optional[float]
+    duration_minutes: Optional[int]
+    pace: Optional[str]
+    intensity: Optional[str]
+    notes: Optional[str]
+
+
+@dataclass(slots=True)
+class _WeekDraft:
+    week_number: int
+    start_date: date
+    end_date: date
+    focus: str
+    total_distance_km: float
+    sessions: List[_SessionDraft]
+
+
+def _plan_cache_key(generator, request: TrainingPlanRequest) -> tuple:
+    # The generator is part of the key: the AI and basic generators
+    # produce different plans for the same request, and the endpoints
+    # call both (the basic one as fallback)
+    return (
+        type(generator).__name__,
+        request.race.value,
+        request.fitness_level.value,
+        request.target_time,
+        request.training_days_per_week,
+        (request.race_date - request.start_date).days
+    )
+
+
+def _plan_to_template(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a generated plan into compact slotted drafts for caching"""
+    return {
+        "weeks": [
+            _WeekDraft(
+                week.week_number, week.start_date, week.end_date,
+                week.focus, week.total_distance_km,
+                [_SessionDraft(
+                    s.date, s.type, s.description, s.distance_km,
+                    s.duration_minutes, s.pace, s.intensity, s.notes)
+                 for s in week.sessions])
+            for week in plan["weeks"]
+        ],
+        "total_weeks": plan["total_weeks"],
+        "total_distance_km": plan["total_distance_km"],
+    }
+
+
+def _plan_from_template(template: Dict[str, Any], delta: timedelta) -> Dict[str, Any]:
+    """Materialize fresh schema objects from a cached template, with
+    every date shifted by delta"""
+    return {
+        "weeks": [
+            WeekPlan.model_construct(
+                week_number=week.week_number,
+                start_date=week.start_date + delta,
+                end_date=week.end_date + delta,
+                focus=week.focus,
+                total_distance_km=week.total_distance_km,
+                sessions=[
+                    TrainingSession.model_construct(
+                        date=s.date + delta,
+                        type=s.type,
+                        description=s.description,
+                        distance_km=s.distance_km,
+                        duration_minutes=s.duration_minutes,
+                        pace=s.pace,
+                        intensity=s.intensity,
+                        notes=s.notes)
+                    for s in week.sessions])
+            for week in template["weeks"]
+        ],
+        "total_weeks": template["total_weeks"],
+        "total_distance_km": template["total_distance_km"],
+    }
+
+
+def generate_plan_cached(generator, request: TrainingPlanRequest) -> Dict[str, Any]:
+    """Generate a plan through the shared cache.
+
+    Identical (race, fitness, target time, days/week, duration)
+    requests reuse the cached plan template; only the dates differ, so
+    a hit materializes fresh, rebased schema objects from the drafts.
+    Callers always receive private objects and may mutate them freely.
+    """
+    key = _plan_cache_key(generator, request)
+    hit = _plan_cache.get(key)
+
+    if hit is not None:
+        _plan_cache.move_to_end(key)
+        cached_start, template = hit
+        return _plan_from_template(template, request.start_date - cached_start)
+
+    plan = generator.generate_plan(request)
+
+    if len(_plan_cache) >= _PLAN_CACHE_MAXSIZE:
+        _plan_cache.popitem(last=False)
+    _plan_cache[key] = (request.start_date, _plan_to_template(plan))
+
+    return plan
+
+# Original training generator (fallback)
+
+
+class TrainingPlanGenerator:
+    """Generates training plans based on user data (specs in _SESSION_SPEC)"""
 
     def generate_plan(self, request: TrainingPlanRequest) -> Dict[str, Any]:
         """Generates a complete training plan"""
 
         # Calculate number of weeks
-        training_weeks = self._calculate_training_weeks(
-            request.start_date, request.race_date)
+        training_weeks = _training_weeks(request.start_date, request.race_date)
 
         # Determine weekly structure based on fitness level
         weekly_structure = self._get_weekly_structure(
@@ -60,20 +338,29 @@ class TrainingPlanGenerator:
             request.training_days_per_week
         )
 
-        # Generate weeks
-        weeks = []
-        total_distance = 0
-
-        for week_num in range(1, training_weeks + 1):
-            week_plan = self._generate_week(
-                week_number=week_num,
-                total_weeks=training_weeks,
-                start_date=request.start_date,
-                request=request,
-                weekly_structure=weekly_structure
-            )
-            weeks.append(week_plan)
-            total_distance += week_plan.total_distance_km
+        # All weekly volumes in one vectorized pass
+        base_distance = _base_distance(
+            request.fitness_level, request.target_time)
+        week_distances = _week_distances(training_weeks, base_distance)
+
+        # Training days repeat on a fixed 7-day stride: resolve the
+        # sorted offsets once and lay out every week's dates up front
+        offsets = _SORTED_OFFSETS[len(weekly_structure)]
+        week_starts = [request.start_date + _WEEK_DELTA * i
+                       for i in range(training_weeks)]
+        session_dates = [[week_start + _DAY_DELTAS[d] for d in offsets]
+                         for week_start in week_starts]
+
+        # Generate weeks; bind the method once so the comprehension body
+        # is lookup-free
+        _gen = self._generate_week
+        weeks = [
+            _gen(week_num, training_weeks, week_starts[week_num - 1],
+                 weekly_structure, int(week_distances[week_num - 1]),
+                 session_dates[week_num - 1])
+            for week_num in range(1, training_weeks + 1)
+        ]
+        total_distance = sum(week.total_distance_km for week in weeks)
 
         return {
             "weeks": weeks,
@@ -81,62 +368,22 @@ class TrainingPlanGenerator:
             "total_distance_km": int(round(total_distance))
         }
 
-    def _calculate_training_weeks(self, start_date: date, race_date: date) -> int:
-        """Calculates number of training weeks"""
-        delta = race_date - start_date
-        weeks = delta.days // 7
-        return max(4, min(20, weeks))  # Between 4-20 weeks
-
-    def _get_weekly_structure(self, fitness_level: str, days_per_week: int) -> Dict[str, Any]:
+    def _get_weekly_structure(self, fitness_level: str, days_per_week: int) -> Tuple[str, ...]:
         """Determines weekly structure based on fitness level"""
+        return _WEEKLY_STRUCTURE_TABLE[(fitness_level, days_per_week)]
 
-        base_structures = {
-            "beginner": {
-                3: ["easy_run", "easy_run", "long_run"],
-                4: ["easy_run", "tempo_run", "easy_run", "long_run"],
-                5: ["easy_run", "tempo_run", "easy_run", "recovery_run", "long_run"],
-                6: ["easy_run", "tempo_run", "easy_run", "hill_training", "recovery_run", "long_run"],
-                7: ["easy_run", "tempo_run", "easy_run", "interval_training", "easy_run", "recovery_run", "long_run"]
-            },
-            "intermediate": {
-                3: ["tempo_run", "interval_training", "long_run"],
-                4: ["easy_run", "tempo_run", "interval_training", "long_run"],
-                5: ["easy_run", "tempo_run", "interval_training", "hill_training", "long_run"],
-                6: ["easy_run", "tempo_run", "interval_training", "hill_training", "recovery_run", "long_run"],
-                7: ["easy_run", "tempo_run", "easy_run", "interval_training", "hill_training", "recovery_run", "long_run"]
-            },
-            "advanced": {
-                4: ["tempo_run", "interval_training", "hill_training", "long_run"],
-                5: ["easy_run", "tempo_run", "interval_training", "hill_training", "long_run"],
-                6: ["easy_run", "tempo_run", "interval_training", "hill_training", "tempo_run", "long_run"],
-                7: ["easy_run", "tempo_run", "easy_run", "interval_training", "hill_training", "tempo_run", "long_run"]
-            }
-        }
-
-        return base_structures[fitness_level][days_per_week]
+    def _generate_week(self, week_number: int, total_weeks: int, week_start: date,
+                       weekly_structure: Tuple[str, ...], week_distance: int,
+                       session_dates: List[date]) -> WeekPlan:
+        """Generates a week of training from precomputed dates"""
 
-    def _generate_week(self, week_number: int, total_weeks: int, start_date: date,
-                       request: TrainingPlanRequest, weekly_structure: List[str]) -> WeekPlan:
-        """Generates a week of training"""
-
-        # Calculate week start date
-        week_start = start_date + timedelta(weeks=week_number - 1)
-        week_end = week_start + timedelta(days=6)
+        week_end = week_start + _DAY_DELTAS[6]
 
         # Determine week focus based on phase
         week_focus = self._determine_week_focus(week_number, total_weeks)
 
-        # Calculate weekly volume
-        base_distance = self._calculate_base_distance(
-            request.fitness_level, request.target_time)
-        week_distance = self._calculate_week_distance(
-            week_number, total_weeks, base_distance, week_focus
-        )
-
         # Generate sessions
         sessions = []
-        session_dates = self._get_training_days(
-            week_start, len(weekly_structure))
 
         for i, session_type in enumerate(weekly_structure):
             session = self._create_training_session(
@@ -149,7 +396,7 @@ class TrainingPlanGenerator:
             )
             sessions.append(session)
 
-        return WeekPlan(
+        return WeekPlan.model_construct(
             week_number=week_number,
             start_date=week_start,
             end_date=week_end,
@@ -162,165 +409,39 @@ class TrainingPlanGenerator:
         """Determines week focus based on periodization"""
         progress = week_number / total_weeks
 
-        if progress <= 0.3:  # First 30%
-            return {
-                "name": "Basbyggnad",
-                "description": "Bygg upp grundkondition och löpvolym"
-            }
-        elif progress <= 0.7:  # 30-70%
-            return {
-                "name": "Styrka och fart",
-                "description": "Utveckla löpkraft och hastighet"
-            }
-        elif progress <= 0.9:  # 70-90%
-            return {
-                "name": "Tävlingsförberedelse",
-                "description": "Träna i tävlingstempo och finslipa formen"
-            }
-        else:  # Last 10%
-            return {
-                "name": "Avtrappning",
-                "description": "Minska volymen och vila inför tävling"
-            }
-
-    def _calculate_base_distance(self, fitness_level: str, target_time: str) -> float:
-        """Calculates base volume based on target level"""
-        # Convert target time to minutes
-        time_parts = target_time.split(':')
-        target_minutes = int(time_parts[0]) * 60 + int(time_parts[1])
-
-        # Base volume according to fitness level and target level
-        base_distances = {
-            "beginner": {"fast": 35, "medium": 30, "slow": 25},
-            "intermediate": {"fast": 50, "medium": 45, "slow": 40},
-            "advanced": {"fast": 70, "medium": 60, "slow": 55}
-        }
-
-        # Categorize target level (for 30km Lidingöloppet)
-        if target_minutes < 150:  # Under 2:30
-            speed_category = "fast"
-        elif target_minutes < 210:  # 2:30-3:30
-            speed_category = "medium"
-        else:  # Over 3:30
-            speed_category = "slow"
-
-        return base_distances[fitness_level][speed_category]
-
-    def _calculate_week_distance(self, week_number: int, total_weeks: int,
-                                 base_distance: float, week_focus: Dict[str, str]) -> int:
-        """Calculates weekly volume with periodization"""
-        progress = week_number / total_weeks
-
-        if progress <= 0.3:  # Base building - gradual increase
-            multiplier = 0.7 + (progress * 1.0)  # 0.7 to 1.0
-        elif progress <= 0.7:  # Peak phase
-            # Peak around 1.15
-            multiplier = 1.0 + \
-                (0.3 * math.sin((progress - 0.3) * math.pi / 0.4))
-        elif progress <= 0.9:  # Specific phase
-            multiplier = 1.0
-        else:  # Taper
-            multiplier = 0.6  # Significantly reduce last week
-
-        return int(round(base_distance * multiplier))
-
-    def _get_training_days(self, week_start: date, num_sessions: int) -> List[date]:
-        """Distributes training sessions across the week"""
-        # Standard distribution: Monday, Wednesday, Friday, Saturday, Tuesday, Thursday, Sunday
-        preferred_days = [0, 2, 4, 5, 1, 3, 6]  # Monday = 0
-
-        training_days = []
-        for i in range(num_sessions):
-            day_offset = preferred_days[i % 7]
-            training_days.append(week_start + timedelta(days=day_offset))
-
-        return sorted(training_days)
+        for threshold, focus in _WEEK_FOCUS_TABLE:
+            if progress <= threshold:
+                return focus
+        return _FOCUS_TAPER  # Last 10%
 
     def _create_training_session(self, date: date, session_type: str, week_focus: Dict[str, str],
                                  total_week_distance: float, session_index: int,
                                  total_sessions: int) -> TrainingSession:
         """Creates a training session"""
 
-        session_info = self.session_types[session_type]
+        spec = _SESSION_SPEC[session_type]
 
         # Calculate session distance
         distance = self._calculate_session_distance(
-            session_type, total_week_distance, session_index, total_sessions
+            spec, total_week_distance, session_index, total_sessions
         )
 
-        # Generate description
-        description = self._generate_session_description(
-            session_type, session_info, distance, week_focus
-        )
-
-        # Calculate pace
-        pace = self._calculate_pace(session_type, distance)
-
-        return TrainingSession(
+        # Internally generated data is already well-formed, so skip
+        # field validation on construction
+        return TrainingSession.model_construct(
             date=date,
-            type=session_info["name"],
-            description=description,
+            type=spec.name,
+            description=spec.desc_template.format(d=distance),
             distance_km=distance,
-            pace=pace,
-            intensity=session_info["intensity"]
+            pace=spec.base_pace,
+            intensity=spec.intensity
         )
 
-    def _calculate_session_distance(self, session_type: str, total_week_distance: float,
+    def _calculate_session_distance(self, spec: SessionSpec, total_week_distance: float,
                                     session_index: int, total_sessions: int) -> int:
         """Calculates distance for a training session"""
-
-        # Distribution of weekly volume
-        distribution = {
-            "easy_run": 0.15,      # 15% of week
-            "recovery_run": 0.10,   # 10% of week
-            "tempo_run": 0.20,      # 20% of week
-            "interval_training": 0.15,  # 15% of week
-            "hill_training": 0.15,  # 15% of week
-            "long_run": 0.35       # 35% of week
-        }
-
-        base_distance = total_week_distance * \
-            distribution.get(session_type, 0.15)
-
-        # Minimum and maximum distances
-        if session_type == "long_run":
-            return int(round(max(8, min(25, base_distance))))
-        elif session_type == "recovery_run":
-            return int(round(max(3, min(8, base_distance))))
-        else:
-            return int(round(max(4, min(15, base_distance))))
-
-    def _calculate_pace(self, session_type: str, distance: float) -> str:
-        """Calculates recommended pace"""
-
-        # Base pace (will later be adapted to user's target level)
-        base_paces = {
-            "easy_run": "6:00",
-            "recovery_run": "6:30",
-            "tempo_run": "5:20",
-            "interval_training": "4:50",
-            "hill_training": "5:40",
-            "long_run": "5:50"
-        }
-
-        return base_paces.get(session_type, "6:00")
-
-    def _generate_session_description(self, session_type: str, session_info: Dict[str, str],
-                                      distance: float, week_focus: Dict[str, str]) -> str:
-        """Generates detailed description for training session"""
-
-        base_description = session_info["description"]
-
-        specific_descriptions = {
-            "easy_run": f"Löp {distance} km i lugnt tempo. Fokusera på teknik och andning.",
-            "recovery_run": f"Mycket lätt jogging {distance} km. Hjälper kroppen att återhämta sig.",
-            "tempo_run": f"Löp {distance} km i medelhårt tempo, ungefär som din måltid i loppet.",
-            "interval_training": f"Intervallträning totalt {distance} km. Växla mellan hög intensitet och vila.",
-            "hill_training": f"Backträning {distance} km. Sök upp backar och träna löpkraft.",
-            "long_run": f"Långpass {distance} km. Bygg uthållighet med stadigt tempo."
-        }
-
-        return specific_descriptions.get(session_type, f"{base_description} - {distance} km")
+        base_distance = total_week_distance * spec.distribution
+        return int(round(max(spec.min_km, min(spec.max_km, base_distance))))
 
 
 # AI-Enhanced Training Generator
@@ -336,8 +457,10 @@ class AIEnhancedTrainingPlanGenerator:
 
         try:
             # Lazy imports
-            from core.rag.agents import race_buddy_agents
-            from core.vector_store import vector_store
+            from core.rag.agents import get_agents
+            from core.vector_store import get_vector_store
+
+            vector_store = get_vector_store()
 
             # 1. Get race-specific information from RAG
             race_context = self._get_race_context(
@@ -349,18 +472,18 @@ class AIEnhancedTrainingPlanGenerator:
 
             # 3. Generate training plan with AI
             ai_plan = self._generate_ai_training_plan(
-                ai_prompt, race_buddy_agents)
+                ai_prompt, get_agents())
 
             # 4. Structure the result
             structured_plan = self._structure_plan_data(ai_plan, request)
 
             return structured_plan
 
-        except Exception as e:
-            logger.error(f"Error generating AI training plan: {e}")
-            # Fallback to simple plan if AI fails
-            fallback_generator = TrainingPlanGenerator()
-            return fallback_generator.generate_plan(request)
+        except Exception:
+            logger.exception("Error generating AI training plan")
+            # Let the caller fall back: silently returning the basic
+            # plan here would be cached and reported as an AI result
+            raise
 
     def _get_race_context(self, race_name: str, vector_store) -> str:
         """Gets race-specific information from vector database"""
@@ -398,8 +521,7 @@ class AIEnhancedTrainingPlanGenerator:
         """Creates AI prompt for training plan"""
 
         # Calculate training period
-        training_weeks = self._calculate_training_weeks(
-            request.start_date, request.race_date)
+        training_weeks = _training_weeks(request.start_date, request.race_date)
 
         prompt = f"""Du är en expert löpträningscoach som ska skapa en MYCKET SPECIFIK träningsplan för Lidingöloppet.
 
@@ -473,24 +595,17 @@ Returnera träningsplanen som JSON med följande struktur:
         """Generates training plan with AI"""
         try:
             # Use training coach agent
-            response = race_buddy_agents.chat(prompt)
+            response = race_buddy_agents.chat_sync(prompt)
 
             if response["success"]:
-                # Try to parse JSON from response
-                import json
-                import re
-
                 # Extract JSON from response
                 content = response["response"]
 
-                # Find JSON block in response
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group()
-                    return json.loads(json_str)
-                else:
-                    # If no JSON found, use entire response as text
-                    return {"ai_response": content}
+                parsed = _extract_json(content)
+                if parsed is not None:
+                    return parsed
+                # If no JSON found, use entire response as text
+                return {"ai_response": content}
             else:
                 raise Exception(
                     f"AI agent failed: {response.get('error', 'Unknown error')}")
@@ -516,11 +631,11 @@ Returnera träningsplanen som JSON med följande struktur:
                     timedelta(weeks=week_data["vecka"] - 1)
 
                 # Create training sessions for the week
-                training_days = self._get_training_days(
+                training_days = _get_training_days(
                     week_start, len(week_data["träningspass"]))
 
                 for i, session_data in enumerate(week_data["träningspass"]):
-                    session = TrainingSession(
+                    session = TrainingSession.model_construct(
                         date=training_days[i],
                         type=session_data.get("typ", "Träning"),
                         description=session_data.get("pass", "Träningspass"),
@@ -534,7 +649,7 @@ Returnera träningsplanen som JSON med följande struktur:
                     week_distance += session.distance_km or 0
 
                 # Create week plan
-                week_plan = WeekPlan(
+                week_plan = WeekPlan.model_construct(
                     week_number=week_data["vecka"],
                     start_date=week_start,
                     end_date=week_start + timedelta(days=6),
@@ -546,10 +661,8 @@ Returnera träningsplanen som JSON med följande struktur:
                 weeks.append(week_plan)
                 total_distance += week_distance
 
-        # If AI didn't return structured plan, create fallback
         if not weeks:
-            fallback_generator = TrainingPlanGenerator()
-            return fallback_generator.generate_plan(request)
+            raise ValueError("AI response contained no structured plan")
 
         return {
             "weeks": weeks,
@@ -559,16 +672,13 @@ Returnera träningsplanen som JSON med följande struktur:
 
     def _extract_pace(self, pass_description: str) -> str:
         """Extracts pace from session description"""
-        import re
-
         # Search for patterns like "@6:30/km" or "@ 6:30/km"
-        pace_match = re.search(r'@\s*(\d+:\d+)/km', pass_description)
+        pace_match = _PACE_AT_RE.search(pass_description)
         if pace_match:
             return pace_match.group(1)
 
         # Search for patterns like "6:30-7:00/km"
-        pace_range_match = re.search(
-            r'(\d+:\d+)-(\d+:\d+)/km', pass_description)
+        pace_range_match = _PACE_RANGE_RE.search(pass_description)
         if pace_range_match:
             return f"{pace_range_match.group(1)}-{pace_range_match.group(2)}"
 
@@ -576,33 +686,7 @@ Returnera träningsplanen som JSON med följande struktur:
 
     def _determine_intensity(self, session_type: str) -> str:
         """Determines intensity based on session type"""
-        intensity_map = {
-            "Grundträning": "low",
-            "Längdpass": "low-medium",
-            "Tempoträning": "medium",
-            "Intervall": "high",
-            "Backträning": "medium-high",
-            "Återhämtning": "very_low"
-        }
-        return intensity_map.get(session_type, "medium")
-
-    def _get_training_days(self, week_start: date, num_sessions: int) -> List[date]:
-        """Distributes training sessions across the week"""
-        # Standard distribution: Monday, Wednesday, Friday, Saturday, Tuesday, Thursday, Sunday
-        preferred_days = [0, 2, 4, 5, 1, 3, 6]  # Monday = 0
-
-        training_days = []
-        for i in range(num_sessions):
-            day_offset = preferred_days[i % 7]
-            training_days.append(week_start + timedelta(days=day_offset))
-
-        return sorted(training_days)
-
-    def _calculate_training_weeks(self, start_date: date, race_date: date) -> int:
-        """Calculates number of training weeks"""
-        delta = race_date - start_date
-        weeks = delta.days // 7
-        return max(4, min(20, weeks))
+        return _INTENSITY_MAP.get(session_type, "medium")
 
 
 # Singleton instances
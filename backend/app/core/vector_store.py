@@ -1,17 +1,37 @@
+import asyncio
 import chromadb
 from chromadb.config import Settings
+from chromadb.utils import embedding_functions
+from collections import OrderedDict
+from contextlib import closing
+from functools import cache
 from pathlib import Path
-import os
+import hashlib
+import httpx
 import logging
+import sqlite3
+import time
 from typing import List, Dict, Any, Optional
-import pandas as pd
+import numpy as np
 from langchain_openai import OpenAIEmbeddings
-import json
 
 from settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Query-cache tuning: exact query strings reuse their embedding, and
+# near-identical queries (cosine >= threshold) reuse the full Chroma
+# result instead of hitting the index again
+_QUERY_EMB_CACHE_MAXSIZE = 512
+_SEMANTIC_CACHE_MAXSIZE = 256
+_SEMANTIC_CACHE_TTL = 7 * 24 * 3600.0
+_SEMANTIC_SIM_THRESHOLD = 0.97
+
+# Embedding-reuse window for streaming adds: vectors for recently seen
+# content are kept so duplicate chunks embed once, without holding the
+# whole ingest's embeddings in memory
+_EMBED_REUSE_MAXSIZE = 4096
+
 
 class RaceBuddyVectorStore:
     """ChromaDB vector store for RaceBuddy RAG system"""
@@ -20,7 +40,12 @@ class RaceBuddyVectorStore:
         self.persist_directory = Path("data/chromadb")
         self.persist_directory.mkdir(parents=True, exist_ok=True)
 
-        # Initialize ChromaDB client
+        # Initialize ChromaDB client. A pgvector-backed store has been
+        # considered (Postgres is already in the stack and Chroma's
+        # persistent add-path slows as collections grow), but at the
+        # current corpus size (~hundreds of documents) Chroma stays
+        # well below that regime and the startup hash gate avoids the
+        # repeated full re-ingests that made it visible.
         self.client = chromadb.PersistentClient(
             path=str(self.persist_directory),
             settings=Settings(
@@ -29,64 +54,204 @@ class RaceBuddyVectorStore:
             )
         )
 
-        # Initialize OpenAI embeddings
+        # Initialize OpenAI embeddings over pooled HTTP/2 clients, so
+        # concurrent embedding calls multiplex warm connections instead
+        # of renegotiating TLS per request
+        http_limits = httpx.Limits(
+            max_connections=50, max_keepalive_connections=20)
+        # dimensions trims text-embedding-3-* vectors (512 instead of
+        # 1536 floats) at negligible quality loss: 3x less storage and
+        # distance compute per query
         self.embeddings = OpenAIEmbeddings(
             model=settings.OPENAI_EMBED_MODEL,
-            openai_api_key=settings.OPENAI_API_KEY
+            openai_api_key=settings.OPENAI_API_KEY,
+            dimensions=settings.EMBED_DIM,
+            chunk_size=settings.EMBED_BATCH_SIZE,
+            http_client=httpx.Client(http2=True, limits=http_limits),
+            http_async_client=httpx.AsyncClient(
+                http2=True, limits=http_limits)
         )
 
         # Collection names
         self.RACE_DATA_COLLECTION = "lidingo_race_data"
         self.TRAINING_COLLECTION = "training_guidelines"
 
+        # Two-tier query cache (see module constants above). Hit
+        # counters are kept on the instance for introspection.
+        self._query_emb_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._semantic_cache: Dict[tuple, list] = {}
+        self.cache_stats = {"embedding_hits": 0, "semantic_hits": 0, "misses": 0}
+
         # Initialize collections
         self._init_collections()
 
+        self._apply_sqlite_pragmas()
+
+    def _apply_sqlite_pragmas(self):
+        """Tune Chroma's sqlite backend for ingest-heavy startup.
+
+        WAL mode with relaxed synchronous turns the per-add fsync into
+        an amortized log append, and the memory temp store / mmap
+        settings cut I/O on the segment scans behind queries. The
+        pragmas are persistent-enough (WAL sticks to the file; the rest
+        are cheap to reapply) and best-effort: a missing or locked
+        database never blocks startup.
+        """
+        db_path = self.persist_directory / "chroma.sqlite3"
+        if not db_path.exists():
+            return
+        try:
+            with closing(sqlite3.connect(db_path)) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("PRAGMA temp_store=MEMORY")
+                conn.execute("PRAGMA mmap_size=268435456")
+        except sqlite3.Error as e:
+            logger.warning(f"Could not tune ChromaDB sqlite backend: {e}")
+
     def _init_collections(self):
         """Initialize ChromaDB collections"""
         try:
+            # Attach the OpenAI embedding function so the collections
+            # can embed raw text themselves when callers do not pass
+            # vectors. Our own add/query paths still precompute
+            # embeddings to keep batching, dedupe and caching.
+            self._embedding_function = embedding_functions.OpenAIEmbeddingFunction(
+                api_key=settings.OPENAI_API_KEY,
+                model_name=settings.OPENAI_EMBED_MODEL,
+                dimensions=settings.EMBED_DIM
+            )
+
             # Race data collection
             self.race_collection = self.client.get_or_create_collection(
                 name=self.RACE_DATA_COLLECTION,
                 metadata={
-                    "description": "Lidingöloppet race data and statistics"}
+                    "description": "Lidingöloppet race data and statistics"},
+                embedding_function=self._embedding_function
             )
 
             # Training guidelines collection
             self.training_collection = self.client.get_or_create_collection(
                 name=self.TRAINING_COLLECTION,
-                metadata={"description": "Training guidelines and tips"}
+                metadata={"description": "Training guidelines and tips"},
+                embedding_function=self._embedding_function
             )
 
+            # Handle cache: get_collection does a sqlite metadata
+            # round-trip per call, so the hot paths index this instead
+            self._collections = {
+                self.RACE_DATA_COLLECTION: self.race_collection,
+                self.TRAINING_COLLECTION: self.training_collection,
+            }
+
             logger.info("ChromaDB collections initialized successfully")
 
         except Exception as e:
             logger.error(f"Error initializing ChromaDB collections: {e}")
             raise
 
+    def _batch_embed_plan(self, batch_docs: List[str],
+                          reuse: "OrderedDict[bytes, List[float]]"):
+        """Hash one batch and pick out the content still to embed"""
+        hashes = [hashlib.blake2b(doc.encode("utf-8"), digest_size=16).digest()
+                  for doc in batch_docs]
+        todo: Dict[bytes, str] = {}
+        for content_hash, doc in zip(hashes, batch_docs):
+            if content_hash not in reuse:
+                todo.setdefault(content_hash, doc)
+        return hashes, todo
+
+    @staticmethod
+    def _batch_collect(hashes: List[bytes], todo: Dict[bytes, str],
+                       vectors: List[List[float]],
+                       reuse: "OrderedDict[bytes, List[float]]") -> List[List[float]]:
+        """Fold fresh vectors into the reuse window and fan out the
+        batch's embeddings in input order"""
+        reuse.update(zip(todo.keys(), vectors))
+        embeddings = [reuse[content_hash] for content_hash in hashes]
+        while len(reuse) > _EMBED_REUSE_MAXSIZE:
+            reuse.popitem(last=False)
+        return embeddings
+
     def add_documents(
         self,
         collection_name: str,
         documents: List[str],
         metadatas: List[Dict[str, Any]],
-        ids: List[str]
+        ids: List[str],
+        batch_size: Optional[int] = None
     ):
-        """Add documents to a collection"""
+        """Add documents to a collection in streaming batches.
+
+        Each batch is embedded (content repeated within the reuse
+        window embeds once) and written before the next starts, so
+        memory stays O(batch_size) instead of holding every vector for
+        the whole ingest.
+        """
         try:
-            collection = self.client.get_collection(collection_name)
-
-            # Generate embeddings using OpenAI
-            embeddings = []
-            for doc in documents:
-                embedding = self.embeddings.embed_query(doc)
-                embeddings.append(embedding)
-
-            collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids,
-                embeddings=embeddings
-            )
+            collection = self._collections[collection_name]
+            batch_size = batch_size or settings.EMBED_BATCH_SIZE
+
+            reuse: "OrderedDict[bytes, List[float]]" = OrderedDict()
+            for start in range(0, len(documents), batch_size):
+                batch_docs = documents[start:start + batch_size]
+                hashes, todo = self._batch_embed_plan(batch_docs, reuse)
+                vectors = self.embeddings.embed_documents(
+                    list(todo.values())) if todo else []
+                collection.add(
+                    documents=batch_docs,
+                    metadatas=metadatas[start:start + batch_size],
+                    ids=ids[start:start + batch_size],
+                    embeddings=self._batch_collect(
+                        hashes, todo, vectors, reuse)
+                )
+
+            logger.info(
+                f"Added {len(documents)} documents to {collection_name}")
+
+        except Exception as e:
+            logger.error(f"Error adding documents to {collection_name}: {e}")
+            raise
+
+    async def aadd_documents(
+        self,
+        collection_name: str,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: List[str],
+        batch_size: Optional[int] = None
+    ):
+        """Async streaming add: up to EMBED_CONCURRENCY batches are in
+        flight at once, and each batch is written to the collection as
+        soon as its vectors arrive, keeping memory bounded by the
+        in-flight batches rather than the whole ingest."""
+        try:
+            collection = self._collections[collection_name]
+            batch_size = batch_size or settings.EMBED_BATCH_SIZE
+            semaphore = asyncio.Semaphore(settings.EMBED_CONCURRENCY)
+
+            reuse: "OrderedDict[bytes, List[float]]" = OrderedDict()
+
+            async def process_batch(start: int):
+                batch_docs = documents[start:start + batch_size]
+                async with semaphore:
+                    hashes, todo = self._batch_embed_plan(batch_docs, reuse)
+                    vectors = await self.embeddings.aembed_documents(
+                        list(todo.values())) if todo else []
+                # Blocking sqlite write; Chroma serializes concurrent
+                # adds internally
+                await asyncio.to_thread(
+                    collection.add,
+                    documents=batch_docs,
+                    metadatas=metadatas[start:start + batch_size],
+                    ids=ids[start:start + batch_size],
+                    embeddings=self._batch_collect(
+                        hashes, todo, vectors, reuse)
+                )
+
+            await asyncio.gather(*(
+                process_batch(start)
+                for start in range(0, len(documents), batch_size)))
 
             logger.info(
                 f"Added {len(documents)} documents to {collection_name}")
@@ -95,6 +260,71 @@ class RaceBuddyVectorStore:
             logger.error(f"Error adding documents to {collection_name}: {e}")
             raise
 
+    def _store_query_embedding(self, query_text: str, embedding: List[float]):
+        if len(self._query_emb_cache) >= _QUERY_EMB_CACHE_MAXSIZE:
+            self._query_emb_cache.popitem(last=False)
+        self._query_emb_cache[query_text] = embedding
+
+    def _embed_query_cached(self, query_text: str) -> List[float]:
+        """embed_query with exact-match LRU reuse"""
+        hit = self._query_emb_cache.get(query_text)
+        if hit is not None:
+            self._query_emb_cache.move_to_end(query_text)
+            self.cache_stats["embedding_hits"] += 1
+            return hit
+
+        embedding = self.embeddings.embed_query(query_text)
+        self._store_query_embedding(query_text, embedding)
+        return embedding
+
+    async def _aembed_query_cached(self, query_text: str) -> List[float]:
+        """aembed_query with exact-match LRU reuse"""
+        hit = self._query_emb_cache.get(query_text)
+        if hit is not None:
+            self._query_emb_cache.move_to_end(query_text)
+            self.cache_stats["embedding_hits"] += 1
+            return hit
+
+        embedding = await self.embeddings.aembed_query(query_text)
+        self._store_query_embedding(query_text, embedding)
+        return embedding
+
+    def _semantic_lookup(self, cache_key: tuple,
+                         embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Return cached results for a near-identical earlier query"""
+        entries = self._semantic_cache.get(cache_key)
+        if not entries:
+            return None
+
+        now = time.monotonic()
+        fresh = [e for e in entries if now - e[2] < _SEMANTIC_CACHE_TTL]
+        if len(fresh) != len(entries):
+            self._semantic_cache[cache_key] = entries = fresh
+            if not entries:
+                return None
+
+        vec = np.asarray(embedding)
+        norm = np.linalg.norm(vec)
+        if norm:
+            vec = vec / norm
+        sims = np.stack([e[0] for e in entries]) @ vec
+        best = int(np.argmax(sims))
+        if sims[best] >= _SEMANTIC_SIM_THRESHOLD:
+            self.cache_stats["semantic_hits"] += 1
+            return entries[best][1]
+        return None
+
+    def _semantic_store(self, cache_key: tuple, embedding: List[float],
+                        results: Dict[str, Any]):
+        vec = np.asarray(embedding)
+        norm = np.linalg.norm(vec)
+        if norm:
+            vec = vec / norm
+        entries = self._semantic_cache.setdefault(cache_key, [])
+        if len(entries) >= _SEMANTIC_CACHE_MAXSIZE:
+            entries.pop(0)
+        entries.append((vec, results, time.monotonic()))
+
     def query_collection(
         self,
         collection_name: str,
@@ -104,10 +334,17 @@ class RaceBuddyVectorStore:
     ) -> Dict[str, Any]:
         """Search in a collection"""
         try:
-            collection = self.client.get_collection(collection_name)
+            collection = self._collections[collection_name]
 
-            # Generate embedding for query
-            query_embedding = self.embeddings.embed_query(query_text)
+            query_embedding = self._embed_query_cached(query_text)
+
+            # Filtered queries bypass the semantic cache; the key does
+            # not capture the where clause
+            cache_key = (collection_name, n_results) if where is None else None
+            if cache_key is not None:
+                cached = self._semantic_lookup(cache_key, query_embedding)
+                if cached is not None:
+                    return cached
 
             results = collection.query(
                 query_embeddings=[query_embedding],
@@ -115,12 +352,32 @@ class RaceBuddyVectorStore:
                 where=where
             )
 
+            if cache_key is not None:
+                self._semantic_store(cache_key, query_embedding, results)
+                self.cache_stats["misses"] += 1
+
             return results
 
         except Exception as e:
             logger.error(f"Error querying {collection_name}: {e}")
             raise
 
+    @staticmethod
+    def _format_results(results: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Flatten a raw Chroma result into per-document dicts"""
+        documents = results['documents']
+        if not documents or not documents[0]:
+            return []
+        metadatas = results['metadatas'][0] or [None] * len(documents[0])
+        distances = results['distances'][0] or [None] * len(documents[0])
+        return [
+            {'content': doc,
+             'metadata': metadata or {},
+             'distance': distance or 0}
+            for doc, metadata, distance
+            in zip(documents[0], metadatas, distances)
+        ]
+
     def query_race_data(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
         """Specific method for searching race data"""
         results = self.query_collection(
@@ -129,17 +386,7 @@ class RaceBuddyVectorStore:
             n_results
         )
 
-        # Format results for easier use
-        formatted_results = []
-        if results['documents'] and results['documents'][0]:
-            for i, doc in enumerate(results['documents'][0]):
-                formatted_results.append({
-                    'content': doc,
-                    'metadata': results['metadatas'][0][i] if results['metadatas'][0] else {},
-                    'distance': results['distances'][0][i] if results['distances'][0] else 0
-                })
-
-        return formatted_results
+        return self._format_results(results)
 
     def query_training_data(self, query: str, n_results: int = 3) -> List[Dict[str, Any]]:
         """Specific method for training data"""
@@ -149,21 +396,124 @@ class RaceBuddyVectorStore:
             n_results
         )
 
-        formatted_results = []
-        if results['documents'] and results['documents'][0]:
-            for i, doc in enumerate(results['documents'][0]):
-                formatted_results.append({
-                    'content': doc,
-                    'metadata': results['metadatas'][0][i] if results['metadatas'][0] else {},
-                    'distance': results['distances'][0][i] if results['distances'][0] else 0
-                })
+        return self._format_results(results)
+
+    async def aquery_collection(
+        self,
+        collection_name: str,
+        query_text: str,
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Async search: the query is embedded without blocking the
+        event loop and the sqlite-backed lookup runs in a thread"""
+        try:
+            collection = self._collections[collection_name]
+
+            query_embedding = await self._aembed_query_cached(query_text)
+
+            cache_key = (collection_name, n_results) if where is None else None
+            if cache_key is not None:
+                cached = self._semantic_lookup(cache_key, query_embedding)
+                if cached is not None:
+                    return cached
+
+            results = await asyncio.to_thread(
+                collection.query,
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                where=where
+            )
 
-        return formatted_results
+            if cache_key is not None:
+                self._semantic_store(cache_key, query_embedding, results)
+                self.cache_stats["misses"] += 1
+
+            return results
+
+        except Exception as e:
+            logger.error(f"Error querying {collection_name}: {e}")
+            raise
+
+    async def aquery_race_data(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+        """Async variant of query_race_data"""
+        results = await self.aquery_collection(
+            self.RACE_DATA_COLLECTION, query, n_results)
+
+        return self._format_results(results)
+
+    async def aquery_training_data(self, query: str, n_results: int = 3) -> List[Dict[str, Any]]:
+        """Async variant of query_training_data"""
+        results = await self.aquery_collection(
+            self.TRAINING_COLLECTION, query, n_results)
+
+        return self._format_results(results)
+
+    @staticmethod
+    def _format_documents(documents: List[str], max_chars: int,
+                          label: str, empty_message: str) -> str:
+        """Join retrieved documents into the prompt-ready string form.
+
+        Doing the truncation and join here keeps the per-result Python
+        loop in one place and lets callers cache the final string form.
+        """
+        if not documents:
+            return empty_message
+
+        return "\n\n".join(
+            f"{label} {i}:\n{doc[:max_chars]}"
+            for i, doc in enumerate(documents, 1))
+
+    def _query_formatted(self, collection_name: str, query: str,
+                         n_results: int, max_chars: int, label: str,
+                         empty_message: str) -> str:
+        results = self.query_collection(collection_name, query, n_results)
+        documents = results['documents'][0] if results['documents'] else []
+        return self._format_documents(documents, max_chars, label, empty_message)
+
+    async def _aquery_formatted(self, collection_name: str, query: str,
+                                n_results: int, max_chars: int, label: str,
+                                empty_message: str) -> str:
+        results = await self.aquery_collection(collection_name, query, n_results)
+        documents = results['documents'][0] if results['documents'] else []
+        return self._format_documents(documents, max_chars, label, empty_message)
+
+    def query_race_data_formatted(self, query: str, n_results: int = 3,
+                                  max_chars: int = 800,
+                                  label: str = "Information") -> str:
+        """Race-data search returning a prompt-ready string"""
+        return self._query_formatted(
+            self.RACE_DATA_COLLECTION, query, n_results, max_chars, label,
+            "Ingen specifik information hittades om det du frågade efter.")
+
+    def query_training_data_formatted(self, query: str, n_results: int = 3,
+                                      max_chars: int = 800,
+                                      label: str = "Träningsråd") -> str:
+        """Training-data search returning a prompt-ready string"""
+        return self._query_formatted(
+            self.TRAINING_COLLECTION, query, n_results, max_chars, label,
+            "Ingen specifik träningsinformation hittades.")
+
+    async def aquery_race_data_formatted(self, query: str, n_results: int = 3,
+                                         max_chars: int = 800,
+                                         label: str = "Information") -> str:
+        """Async race-data search returning a prompt-ready string"""
+        return await self._aquery_formatted(
+            self.RACE_DATA_COLLECTION, query, n_results, max_chars, label,
+            "Ingen specifik information hittades om det du frågade efter.")
+
+    async def aquery_training_data_formatted(self, query: str, n_results: int = 3,
+                                             max_chars: int = 800,
+                                             label: str = "Träningsråd") -> str:
+        """Async training-data search returning a prompt-ready string"""
+        return await self._aquery_formatted(
+            self.TRAINING_COLLECTION, query, n_results, max_chars, label,
+            "Ingen specifik träningsinformation hittades.")
 
     def get_collection_stats(self, collection_name: str) -> Dict[str, Any]:
         """Get statistics for a collection"""
         try:
-            collection = self.client.get_collection(collection_name)
+            collection = self._collections[collection_name]
             count = collection.count()
 
             return {
@@ -176,24 +526,41 @@ class RaceBuddyVectorStore:
             logger.error(f"Error getting stats for {collection_name}: {e}")
             return {"name": collection_name, "error": str(e)}
 
+    def clear_query_caches(self):
+        """Drop cached query results after the corpus changes.
+
+        The semantic tier holds full Chroma results, so it is stale as
+        soon as documents are added; the embedding tier maps query text
+        to its vector and stays valid across ingests.
+        """
+        self._semantic_cache.clear()
+
     def reset_collection(self, collection_name: str):
         """Clear a collection (use with caution!)"""
         try:
             self.client.delete_collection(collection_name)
             logger.info(f"Deleted collection: {collection_name}")
 
-            # Recreate collection
+            # Recreate collection and refresh the handle cache
             if collection_name == self.RACE_DATA_COLLECTION:
                 self.race_collection = self.client.create_collection(
                     name=self.RACE_DATA_COLLECTION,
                     metadata={
-                        "description": "Lidingöloppet race data and statistics"}
+                        "description": "Lidingöloppet race data and statistics"},
+                    embedding_function=self._embedding_function
                 )
+                self._collections[self.RACE_DATA_COLLECTION] = self.race_collection
             elif collection_name == self.TRAINING_COLLECTION:
                 self.training_collection = self.client.create_collection(
                     name=self.TRAINING_COLLECTION,
-                    metadata={"description": "Training guidelines and tips"}
+                    metadata={"description": "Training guidelines and tips"},
+                    embedding_function=self._embedding_function
                 )
+                self._collections[self.TRAINING_COLLECTION] = self.training_collection
+
+            # Cached queries may reference deleted documents
+            self._query_emb_cache.clear()
+            self.clear_query_caches()
 
             logger.info(f"Recreated collection: {collection_name}")
 
@@ -202,5 +569,13 @@ class RaceBuddyVectorStore:
             raise
 
 
-# Singleton instance
-vector_store = RaceBuddyVectorStore()
+@cache
+def get_vector_store() -> RaceBuddyVectorStore:
+    """Process-wide store, created on first use.
+
+    Lazy so importing this module stays free: opening Chroma (sqlite
+    migrations, index load) and building the embeddings client only
+    happen when something actually touches the store - after a worker
+    fork, not before.
+    """
+    return RaceBuddyVectorStore()
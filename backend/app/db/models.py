@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, JSON, Date
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Date, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from datetime import datetime
 
@@ -7,6 +9,12 @@ Base = declarative_base()
 
 class TrainingPlan(Base):
     __tablename__ = "training_plans"
+    __table_args__ = (
+        # Race listing/filter path
+        Index("ix_plan_race_date", "race", "race_date"),
+        # Containment queries into the plan document
+        Index("ix_plan_plan_data_gin", "plan_data", postgresql_using="gin"),
+    )
     
     id = Column(String, primary_key=True, index=True)
     
@@ -25,19 +33,31 @@ class TrainingPlan(Base):
     
     # Training preferences
     training_days_per_week = Column(Integer, default=4)
-    previous_race_times = Column(JSON, default=list)
-    injuries = Column(JSON, default=list)
+    previous_race_times = Column(JSONB, default=list)
+    injuries = Column(JSONB, default=list)
     
-    # Generated plan
-    plan_data = Column(JSON, nullable=False)  # Stores the complete training plan
+    # Generated plan. plan_data is by far the widest column and most
+    # reads don't need it, so it is deferred; callers that do need it
+    # opt in with undefer()/load_only()
+    plan_data = deferred(Column(JSONB, nullable=False))  # Complete training plan
     total_weeks = Column(Integer, nullable=False)
     total_distance_km = Column(Float, nullable=False)
+
+    # Summary aggregates precomputed at plan creation
+    session_distribution = Column(JSONB)  # {session_type: count}
+    weekly_progression = Column(JSONB)    # [{week, distance, focus}, ...]
     
     # File paths
     ics_file_path = Column(String)
+
+    # Display/export strings precomputed at plan creation so the ICS
+    # export handler is a plain attribute read
+    race_display_name = Column(String)
+    ics_filename = Column(String)
     
     # Metadata
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(),
+                        index=True)  # Ordered pagination in the plan listing
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     def __repr__(self):
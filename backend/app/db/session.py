@@ -1,24 +1,93 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from settings import settings
 from db.models import Base
 import logging
+import orjson
 
-# Create engine
+
+def _json_serializer(value) -> str:
+    return orjson.dumps(value).decode("utf-8")
+
+
+# Create engine. Pool sized for ASGI concurrency rather than the
+# 5+10 defaults; LIFO checkout keeps a small set of connections hot
+# instead of cycling through all of them. SQL echo is opt-in via
+# settings - formatting every statement costs real time per query.
 engine = create_engine(
     settings.DB_URL,
-    echo=settings.ENVIRONMENT == "development",  # Show SQL queries in development
+    echo=settings.SQL_ECHO,
+    pool_size=20,
+    max_overflow=40,
+    pool_use_lifo=True,
     pool_pre_ping=True,  # Verify connections before use
     pool_recycle=300,    # Recycle connections after 5 minutes
+    # JSON columns round-trip through orjson's C parser instead of stdlib json
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads,
+)
+
+# Async engine on the same database, served by asyncpg so async endpoints
+# can interleave DB I/O instead of blocking the event loop
+async_engine = create_async_engine(
+    settings.DB_URL.replace("postgresql://", "postgresql+asyncpg://"),
+    echo=settings.SQL_ECHO,
+    pool_size=20,
+    max_overflow=40,
+    pool_use_lifo=True,
+    pool_pre_ping=True,
+    pool_recycle=300,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads,
 )
 
-# Create session factory
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# Schema upgrades for databases created before these columns, types
+# and indexes existed. create_all only creates missing tables - it
+# never alters existing ones - so additive changes are applied
+# explicitly here. Every statement is idempotent: re-running against
+# an up-to-date schema is a no-op.
+_MIGRATIONS = (
+    # Summary aggregates (plan creation precomputes these; older rows
+    # stay NULL and the read paths fall back to recomputing)
+    "ALTER TABLE training_plans"
+    " ADD COLUMN IF NOT EXISTS session_distribution JSONB",
+    "ALTER TABLE training_plans"
+    " ADD COLUMN IF NOT EXISTS weekly_progression JSONB",
+    # Display/export strings for the ICS handler
+    "ALTER TABLE training_plans"
+    " ADD COLUMN IF NOT EXISTS race_display_name VARCHAR",
+    "ALTER TABLE training_plans"
+    " ADD COLUMN IF NOT EXISTS ics_filename VARCHAR",
+    # JSON -> JSONB (no rewrite when the column is already jsonb)
+    "ALTER TABLE training_plans ALTER COLUMN previous_race_times"
+    " TYPE JSONB USING previous_race_times::jsonb",
+    "ALTER TABLE training_plans ALTER COLUMN injuries"
+    " TYPE JSONB USING injuries::jsonb",
+    "ALTER TABLE training_plans ALTER COLUMN plan_data"
+    " TYPE JSONB USING plan_data::jsonb",
+    # Indexes declared on the model, for tables that predate them
+    "CREATE INDEX IF NOT EXISTS ix_plan_race_date"
+    " ON training_plans (race, race_date)",
+    "CREATE INDEX IF NOT EXISTS ix_plan_plan_data_gin"
+    " ON training_plans USING gin (plan_data)",
+    "CREATE INDEX IF NOT EXISTS ix_training_plans_created_at"
+    " ON training_plans (created_at)",
+)
+
 
 def init_db():
-    """Initialize database tables"""
+    """Initialize database tables and apply schema upgrades"""
     try:
         Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            for statement in _MIGRATIONS:
+                conn.execute(text(statement))
         logging.info("Database tables created successfully")
     except Exception as e:
         logging.error(f"Error creating database tables: {e}")
@@ -30,4 +99,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """Dependency to get async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
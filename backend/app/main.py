@@ -1,8 +1,12 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from api.v1.api import api_router
 from db.session import init_db
+from settings import settings
+import asyncio
+import hashlib
 import os
 import logging
 from pathlib import Path
@@ -19,7 +23,10 @@ def create_app() -> FastAPI:
     app = FastAPI(
         title="RaceBuddy API",
         version="0.1.0",
-        description="Personalized training plans and AI coaching for Lidingöloppet"
+        description="Personalized training plans and AI coaching for Lidingöloppet",
+        # orjson serializes responses in C (with native datetime/date
+        # support) instead of the stdlib json encoder
+        default_response_class=ORJSONResponse
     )
 
     # CORS
@@ -44,6 +51,11 @@ def create_app() -> FastAPI:
         try:
             logger.info("Starting RaceBuddy API...")
 
+            # Record the server loop so worker threads can schedule
+            # agent coroutines onto it (see agents.chat_sync)
+            from core.rag.agents import bind_server_loop
+            bind_server_loop()
+
             # 1. Initialize database
             init_db()
             logger.info("Database initialized")
@@ -53,15 +65,15 @@ def create_app() -> FastAPI:
             os.makedirs("data/chromadb", exist_ok=True)
             logger.info("Data directories created")
 
-            # 3. ALWAYS run data ingestion automatically
+            # 3. Run data ingestion only when the CSV content changed
             csv_path = Path("data/lidingo_full_data.csv")
             if csv_path.exists():
-                logger.info("CSV data file found, running data ingestion...")
-
                 try:
-                    from core.vector_store import vector_store
+                    from core.vector_store import get_vector_store
                     from core.data_ingestion import data_ingestion
 
+                    vector_store = get_vector_store()
+
                     # Check current state
                     race_stats = vector_store.get_collection_stats(
                         vector_store.RACE_DATA_COLLECTION)
@@ -73,38 +85,59 @@ def create_app() -> FastAPI:
                     logger.info(
                         f"Current ChromaDB state: {total_docs} documents")
 
-                    # Always run ingestion to ensure fresh data
-                    if total_docs == 0:
+                    # Marker records the hash of the last ingested CSV;
+                    # an unchanged file with populated collections makes
+                    # re-ingestion (Chroma's most expensive path) a no-op
+                    marker_path = Path("data/chromadb/.ingest_hash")
+                    # Embedding config is part of the key: changing
+                    # model or dimensions must force a re-embed
+                    csv_hash = hashlib.blake2b(
+                        csv_path.read_bytes() +
+                        f":{settings.OPENAI_EMBED_MODEL}:{settings.EMBED_DIM}".encode()
+                    ).hexdigest()
+                    try:
+                        stored_hash = marker_path.read_text().strip()
+                    except OSError:
+                        stored_hash = None
+
+                    if total_docs > 0 and stored_hash == csv_hash:
                         logger.info(
-                            "ChromaDB is empty, running full data ingestion...")
+                            "CSV unchanged since last ingestion, skipping re-ingest")
                     else:
+                        if total_docs == 0:
+                            logger.info(
+                                "ChromaDB is empty, running full data ingestion...")
+                        else:
+                            logger.info(
+                                "CSV changed, refreshing ChromaDB with latest data...")
+                            # Reset collections to ensure clean data
+                            vector_store.reset_collection(
+                                vector_store.RACE_DATA_COLLECTION)
+                            vector_store.reset_collection(
+                                vector_store.TRAINING_COLLECTION)
+
+                        # Run ingestion in a worker thread; it is
+                        # blocking work and must not sit on the loop
+                        result = await asyncio.to_thread(
+                            data_ingestion.ingest_all_data)
+                        marker_path.write_text(csv_hash)
+                        logger.info(f"Data ingestion completed successfully!")
+                        logger.info(
+                            f"Total documents: {result['total_documents']}")
+                        logger.info(
+                            f"Race documents: {result['race_documents_created']}")
                         logger.info(
-                            "Refreshing ChromaDB with latest data...")
-                        # Reset collections to ensure clean data
-                        vector_store.reset_collection(
+                            f"Training documents: {result['training_documents_created']}")
+
+                        # Verify final state
+                        race_stats = vector_store.get_collection_stats(
                             vector_store.RACE_DATA_COLLECTION)
-                        vector_store.reset_collection(
+                        training_stats = vector_store.get_collection_stats(
                             vector_store.TRAINING_COLLECTION)
-
-                    # Run ingestion
-                    result = data_ingestion.ingest_all_data()
-                    logger.info(f"Data ingestion completed successfully!")
-                    logger.info(
-                        f"Total documents: {result['total_documents']}")
-                    logger.info(
-                        f"Race documents: {result['race_documents_created']}")
-                    logger.info(
-                        f"Training documents: {result['training_documents_created']}")
-
-                    # Verify final state
-                    race_stats = vector_store.get_collection_stats(
-                        vector_store.RACE_DATA_COLLECTION)
-                    training_stats = vector_store.get_collection_stats(
-                        vector_store.TRAINING_COLLECTION)
-                    final_docs = race_stats.get(
-                        "document_count", 0) + training_stats.get("document_count", 0)
-                    logger.info(
-                        f"ChromaDB now contains {final_docs} documents and is ready!")
+                        final_docs = race_stats.get(
+                            "document_count", 0) + training_stats.get("document_count", 0)
+                        logger.info(
+                            f"ChromaDB now contains {final_docs} documents and is ready!")
 
                 except Exception as e:
                     logger.error(
@@ -120,6 +153,15 @@ def create_app() -> FastAPI:
                     "Please copy your CSV file to data/lidingo_full_data.csv and restart")
                 logger.info("Expected path: /app/data/lidingo_full_data.csv")
 
+            # 4. Warm the quick-question FAQ embeddings so the first
+            # /chat/ask request doesn't pay for them
+            try:
+                from api.v1.endpoints.chat import quick_question_cache
+                await quick_question_cache.awarm()
+                logger.info("Quick-question embeddings warmed")
+            except Exception as e:
+                logger.warning(f"Could not warm quick-question cache: {e}")
+
             logger.info("RaceBuddy API startup completed!")
 
         except Exception as e:
@@ -8,6 +8,7 @@ from pathlib import Path
 class Settings(BaseSettings):
     # Database
     DB_URL: str
+    SQL_ECHO: bool = False
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
@@ -32,6 +33,9 @@ class Settings(BaseSettings):
     RAG_CHUNK_SIZE: int = 1000
     RAG_CHUNK_OVERLAP: int = 200
     RAG_TOP_K_RESULTS: int = 5
+    EMBED_BATCH_SIZE: int = 256
+    EMBED_DIM: int = 512
+    EMBED_CONCURRENCY: int = 3
 
     # Agent Settings
     AGENT_TEMPERATURE: float = 0.2